@@ -0,0 +1,119 @@
+# batch.py
+import sys
+import json
+import time
+import uuid
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, Dict, Any, Optional
+
+from test_agent import get_workflow, run_scraping_agent
+from metrics import METRICS_PORT, start_metrics_server, get_logger
+from export import EXPORT_ROW_GROUP, open_writer
+from tool import warm_parse_pool
+
+
+logger = get_logger(__name__)
+
+BATCH_WORKERS = 8
+
+
+def _run_one(app, index: int, query: str, batch_id: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = run_scraping_agent(query, app=app, thread_id=f"{batch_id}-{index}")
+    result["index"] = index
+    result["query"] = query
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(queries: Iterable[str],
+              workers: int = BATCH_WORKERS,
+              max_pending: Optional[int] = None,
+              batch_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run run_scraping_agent over many queries with a bounded worker pool.
+    - one compiled graph shared by every query, one checkpoint thread id per query
+    - backpressure: at most max_pending queries are submitted at a time, so a
+      generator of millions of queries is consumed lazily
+    - results are yielded as they finish (not in input order), each carries
+      its input 'index' and 'query'
+    - thread ids are derived from batch_id and the input index, so re-running
+      the same batch_id after a crash resumes from the checkpoints; the checkpointer
+      drops them once they are older than checkpoint_max_age
+    """
+    app = get_workflow()
+    max_pending = max_pending or workers * 2
+    batch_id = batch_id or f"batch-{uuid.uuid4().hex[:12]}"
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        pending = set()
+        for index, query in enumerate(queries):
+            query = query.strip()
+            if not query:
+                continue
+
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+            pending.add(pool.submit(_run_one, app, index, query, batch_id))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def _serializable(result: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(result)
+    out["messages"] = [getattr(m, "content", str(m)) for m in result.get("messages", [])]
+    details = dict(result.get("details_results") or {})
+    if "products" in details:
+        details["products"] = [p.to_dict() for p in details["products"]]
+    out["details_results"] = details
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the scraping agent over a file of queries (one per line).")
+    parser.add_argument("queries", help="path to a query file, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON output path, '-' for stdout")
+    parser.add_argument("-w", "--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("--batch-id", default=None, help="reuse a previous batch id to resume it")
+    parser.add_argument("--export", default=None,
+                        help="also write every product as a typed row to this .ndjson/.arrow/.parquet file")
+    parser.add_argument("--row-group", type=int, default=EXPORT_ROW_GROUP)
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.queries == "-" else open(args.queries, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+    writer = open_writer(args.export, args.row_group) if args.export else None
+
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    warm_parse_pool()
+
+    ok = failed = 0
+    try:
+        for result in run_batch(source, workers=args.workers, max_pending=args.max_pending,
+                                batch_id=args.batch_id):
+            sink.write(json.dumps(_serializable(result), default=str) + "\n")
+            sink.flush()
+            if writer is not None:
+                writer.write_result(result)
+            if result.get("success"):
+                ok += 1
+            else:
+                failed += 1
+    finally:
+        if writer is not None:
+            writer.close()
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    logger.info(f"batch finished: {ok} succeeded, {failed} failed")
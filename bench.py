@@ -0,0 +1,486 @@
+# bench.py
+"""
+Offline benchmark for the scraping pipeline.
+
+Replays recorded Serper responses (bench_fixtures/serper.json) and saved product
+pages (bench_fixtures/pages/, served by a local fixture server) and swaps every
+Gemini model for a deterministic fake ReAct chat model, so no API key or network
+access is needed. Results are written as JSON for comparison between versions:
+
+    python bench.py -o bench_results.json
+    python bench.py -o new.json --baseline bench_results.json
+"""
+import os
+import asyncio
+import re
+import sys
+import json
+import time
+import tempfile
+import argparse
+import subprocess
+import platform
+import resource
+import threading
+import statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Tuple
+from urllib.parse import urlparse
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from budget import estimate_tokens
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+REGRESSION_THRESHOLD = 1.2
+
+
+# --- fixtures -----------------------------------------------------------------
+
+class FixtureServer:
+    """Serves saved product pages at http://127.0.0.1:<port>/<host><path>."""
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR):
+        with open(os.path.join(fixtures_dir, "pages.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        pages_dir = os.path.join(fixtures_dir, "pages")
+        self.pages = {}
+        for key, filename in manifest.items():
+            with open(os.path.join(pages_dir, filename), "rb") as f:
+                self.pages[key] = f.read()
+
+        pages = self.pages
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = pages.get(urlparse(self.path).path.lstrip("/"))
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def local_url(self, url: str) -> str:
+        """Map a recorded marketplace url onto the fixture server, keeping host in the path."""
+        parts = urlparse(url)
+        return f"{self.base_url}/{parts.netloc}{parts.path}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FixtureSearch:
+    """Stand-in for GoogleSerperAPIWrapper that replays recorded responses."""
+
+    def __init__(self, server: FixtureServer, fixtures_dir: str = FIXTURES_DIR):
+        with open(os.path.join(fixtures_dir, "serper.json"), encoding="utf-8") as f:
+            self.responses = json.load(f)
+        self.server = server
+        self.calls = 0
+
+    def results(self, query: str) -> Dict[str, Any]:
+        from tool import canonical_query
+
+        self.calls += 1
+        raw = json.loads(json.dumps(self.responses.get(canonical_query(query), {"organic": []})))
+        for item in raw.get("organic", []):
+            item["link"] = self.server.local_url(item["link"])
+        return raw
+
+    async def aresults(self, query: str) -> Dict[str, Any]:
+        return self.results(query)
+
+
+class FakeReActChatModel(BaseChatModel):
+    """
+    Deterministic chat model that speaks the ReAct format used by create_agent:
+    first turn calls the prompt's tool with the obvious argument, the turn after
+    an observation gives a short final answer. Anything else (the supervisor)
+    is answered with FINISH.
+    """
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-react"
+
+    def _reply(self, prompt: str) -> str:
+        tool_match = re.search(r"should be one of \[(\w+)\]", prompt)
+        if tool_match is None:
+            return "FINISH"
+        if prompt.rstrip().endswith("Thought:"):
+            return "Thought: I now know the final answer\nFinal Answer: Extracted the requested product data."
+
+        tool_name = tool_match.group(1)
+        if tool_name == "getProductLinks":
+            query = re.search(r"Search for product links for: (.*)", prompt).group(1).strip()
+            return f"Thought: search the marketplaces\nAction: getProductLinks\nAction Input: {query}"
+        links = re.search(r"from these links: (.*)", prompt).group(1).strip()
+        return f"Thought: fetch the product pages\nAction: {tool_name}\nAction Input: {links}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        reply = self._reply(prompt)
+        usage = {"input_tokens": estimate_tokens(prompt), "output_tokens": estimate_tokens(reply)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        self.calls += 1
+        self.input_tokens += usage["input_tokens"]
+        self.output_tokens += usage["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+
+# --- measurement ----------------------------------------------------------------
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(samples),
+        "mean": statistics.fmean(samples),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def _timed(name: str, fn, timings: Dict[str, List[float]]):
+    def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return fn(state)
+        finally:
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+    return wrapper
+
+
+def _reset_caches():
+    """Every iteration starts cold: no search cache, response cache, product index or rate limiting."""
+    import tool
+    from cache import TTLCache
+
+    tool._search_cache = TTLCache(path=None)
+    tool._index = None
+    tool._fetcher.cache = None
+    tool._fetcher.scheduler = None
+    tool._afetcher.cache = None
+    tool._afetcher.scheduler = None
+
+
+def bench_parse(server: FixtureServer, iterations: int, parse_workers: int = 0) -> Dict[str, Any]:
+    from bs4 import BeautifulSoup
+    from extract import extract_product, StreamingScanner
+    from extract import HTML_PARSER
+
+    full, streaming = [], []
+    for _ in range(iterations):
+        for key, body in server.pages.items():
+            url = "https://" + key
+            start = time.perf_counter()
+            extract_product(BeautifulSoup(body, HTML_PARSER), url)
+            full.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            scanner = StreamingScanner()
+            for i in range(0, len(body), 16 * 1024):
+                if scanner.feed_bytes(body[i:i + 16 * 1024]):
+                    break
+            streaming.append(time.perf_counter() - start)
+    results = {"full_parse_seconds": _summary(full), "streaming_scan_seconds": _summary(streaming)}
+    if parse_workers:
+        results["pool"] = bench_parse_pool(server, iterations, parse_workers)
+    return results
+
+
+def bench_parse_pool(server: FixtureServer, iterations: int, workers: int) -> Dict[str, Any]:
+    """Full parse throughput inline vs on a warmed ParsePool of the given size."""
+    from extract import parse_html
+    from parsepool import ParsePool
+
+    pages = [("https://" + key, body) for key, body in server.pages.items()] * max(iterations, 1) * workers
+
+    start = time.perf_counter()
+    for url, body in pages:
+        parse_html(body, url)
+    inline = time.perf_counter() - start
+
+    pool = ParsePool(workers)
+    try:
+        pool.warm()
+        start = time.perf_counter()
+        for future in [pool.submit(body, url) for url, body in pages]:
+            future.result()
+        pooled = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    return {
+        "workers": workers,
+        "inline_pages_per_second": len(pages) / inline,
+        "pool_pages_per_second": len(pages) / pooled,
+    }
+
+
+def bench_tools(server: FixtureServer, search: FixtureSearch, queries: List[str],
+                iterations: int) -> Dict[str, Any]:
+    import tool
+
+    link_times, detail_times = [], []
+    pages = 0
+    detail_total = 0.0
+    for _ in range(iterations):
+        for query in queries:
+            _reset_caches()
+            start = time.perf_counter()
+            links = tool.getProductLinks.invoke({"productName": query})
+            link_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            tool.getProductDetails.invoke({"links": links["results"]})
+            elapsed = time.perf_counter() - start
+            detail_times.append(elapsed)
+            detail_total += elapsed
+            pages += len(links["results"])
+
+    return {
+        "getProductLinks_seconds": _summary(link_times),
+        "getProductDetails_seconds": _summary(detail_times),
+        "pages_per_second": pages / detail_total if detail_total else 0.0,
+    }
+
+
+def bench_pipeline(queries: List[str], iterations: int) -> Dict[str, Any]:
+    import test_agent
+    from checkpoint import SqliteCheckpointer, make_serde
+    from records import LinkRecord, ProductRecord
+    from router import LLMRouter
+
+    fake = FakeReActChatModel()
+    test_agent.runtime.set("link_chain_agent", test_agent.create_agent(
+        "fake", [test_agent.getProductLinks], test_agent.LinkNodePrompt, llm_model=fake))
+    test_agent.runtime.set("detail_extract_agent", test_agent.create_agent(
+        "fake", [test_agent.getProductDetails], test_agent.DetailNodePrompt, llm_model=fake))
+    for policy in test_agent.router.policies:
+        if isinstance(policy, LLMRouter):
+            policy._model = fake
+    test_agent.runtime.set(("chat_model", test_agent.SUMMARY_MODEL), fake)
+
+    timings: Dict[str, List[float]] = {}
+    originals = {name: getattr(test_agent, name)
+                 for name in ("supervisor_node", "link_chain_node", "detail_extract_node")}
+    for name, fn in originals.items():
+        setattr(test_agent, name, _timed(name, fn, timings))
+
+    try:
+        checkpoints = os.path.join(tempfile.mkdtemp(prefix="bench-"), "checkpoints.sqlite")
+        app = test_agent.create_workflow(
+            checkpointer=SqliteCheckpointer(checkpoints, serde=make_serde([LinkRecord, ProductRecord])))
+
+        query_times = []
+        failures = 0
+        for i in range(iterations):
+            for query in queries:
+                _reset_caches()
+                start = time.perf_counter()
+                result = test_agent.run_scraping_agent(query, app=app, thread_id=f"bench-{i}-{query}")
+                query_times.append(time.perf_counter() - start)
+                failures += 0 if result.get("success") else 1
+    finally:
+        for name, fn in originals.items():
+            setattr(test_agent, name, fn)
+
+    runs = len(query_times) or 1
+    return {
+        "node_mode": test_agent.NODE_MODE,
+        "query_seconds": _summary(query_times),
+        "node_seconds": {name: _summary(samples) for name, samples in timings.items()},
+        "llm_calls_per_query": fake.calls / runs,
+        "input_tokens_per_query": fake.input_tokens / runs,
+        "output_tokens_per_query": fake.output_tokens / runs,
+        "failures": failures,
+    }
+
+
+def bench_streaming(queries: List[str], iterations: int) -> Dict[str, Any]:
+    """Pipeline mode through stream_scraping_agent: time to first product vs the whole run."""
+    import test_agent
+    from checkpoint import SqliteCheckpointer, make_serde
+    from records import LinkRecord, ProductRecord
+
+    checkpoints = os.path.join(tempfile.mkdtemp(prefix="bench-"), "checkpoints.sqlite")
+    app = test_agent.create_workflow(
+        checkpointer=SqliteCheckpointer(checkpoints, serde=make_serde([LinkRecord, ProductRecord])),
+        pipeline=True)
+
+    first, total = [], []
+    failures = 0
+    for i in range(iterations):
+        for query in queries:
+            _reset_caches()
+            start = time.perf_counter()
+            first_seen = None
+            for event in test_agent.stream_scraping_agent(query, app=app, thread_id=f"bench-stream-{i}-{query}"):
+                if "product" in event and first_seen is None:
+                    first_seen = time.perf_counter() - start
+                if "result" in event:
+                    failures += 0 if event["result"].get("success") else 1
+            total.append(time.perf_counter() - start)
+            if first_seen is not None:
+                first.append(first_seen)
+
+    return {
+        "first_product_seconds": _summary(first),
+        "query_seconds": _summary(total),
+        "failures": failures,
+    }
+
+
+def bench_async(queries: List[str], iterations: int) -> Dict[str, Any]:
+    """All queries of an iteration at once through arun_scraping_agent on one event loop."""
+    import test_agent
+    import tool
+    from checkpoint import SqliteCheckpointer, make_serde
+    from records import LinkRecord, ProductRecord
+
+    checkpoints = os.path.join(tempfile.mkdtemp(prefix="bench-"), "checkpoints.sqlite")
+    app = test_agent.create_workflow(
+        checkpointer=SqliteCheckpointer(checkpoints, serde=make_serde([LinkRecord, ProductRecord])),
+        use_async=True)
+
+    async def run() -> Tuple[List[float], int]:
+        wall, failures = [], 0
+        try:
+            for i in range(iterations):
+                _reset_caches()
+                start = time.perf_counter()
+                results = await asyncio.gather(*(
+                    test_agent.arun_scraping_agent(query, app=app, thread_id=f"bench-async-{i}-{query}")
+                    for query in queries))
+                wall.append(time.perf_counter() - start)
+                failures += sum(0 if result.get("success") else 1 for result in results)
+        finally:
+            await tool._afetcher.close()
+        return wall, failures
+
+    wall, failures = asyncio.run(run())
+    total = sum(wall)
+    return {
+        "batch_seconds": _summary(wall),
+        "queries_per_second": len(queries) * len(wall) / total if total else 0.0,
+        "failures": failures,
+    }
+
+
+def _process_seconds(code: str, env: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def bench_startup(iterations: int) -> Dict[str, Any]:
+    """
+    Cold process cost, timed from outside: importing the workflow module, then building
+    the graph on first use, each net of a bare interpreter start.
+    """
+    samples: Dict[str, List[float]] = {"import_seconds": [], "first_workflow_seconds": []}
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    for _ in range(iterations):
+        bare = _process_seconds("pass", env)
+        imported = _process_seconds("import test_agent", env)
+        built = _process_seconds("import test_agent; test_agent.get_workflow()", env)
+        samples["import_seconds"].append(max(0.0, imported - bare))
+        samples["first_workflow_seconds"].append(max(0.0, built - imported))
+    return {key: _summary(values) for key, values in samples.items()}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], path: str = "") -> List[str]:
+    """Flag every numeric metric that grew by more than REGRESSION_THRESHOLD."""
+    regressions = []
+    for key, value in current.items():
+        name = f"{path}.{key}" if path else key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            regressions += compare(value, old or {}, name)
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old > 0:
+            higher_is_better = key.endswith("_per_second")
+            ratio = old / value if higher_is_better and value else value / old
+            if ratio > REGRESSION_THRESHOLD:
+                regressions.append(f"{name}: {old:.4g} -> {value:.4g}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the scraping pipeline.")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    parser.add_argument("--parse-workers", type=int, default=0, help="also measure a parse pool of this size")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("google_api_key", "offline-benchmark")
+
+    import tool
+
+    with FixtureServer() as server:
+        search = FixtureSearch(server)
+        tool._search_client = search
+        queries = list(search.responses.keys())
+
+        results = {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "queries": queries,
+            "startup": bench_startup(args.iterations),
+            "parse": bench_parse(server, args.iterations, args.parse_workers),
+            "tools": bench_tools(server, search, queries, args.iterations),
+            "pipeline": bench_pipeline(queries, args.iterations),
+            "streaming": bench_streaming(queries, args.iterations),
+            "async": bench_async(queries, args.iterations),
+        }
+        results["search_calls"] = search.calls
+        results["peak_rss_mb"] = peak_rss_mb()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"benchmark results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# budget.py
+import os
+import re
+import json
+import math
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from ids import normalize_url
+from metrics import record
+
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("context_token_budget", "1500"))
+SNIPPET_CHARS = int(os.getenv("context_snippet_chars", "160"))
+MAX_SPECS = 8
+
+LINK_FIELDS = ["source", "url", "title", "snippet"]
+PRODUCT_FIELDS = ["url", "source", "asin", "title", "price", "availability", "rating", "specs", "error"]
+
+_PIECES = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local token estimate, no tokenizer download needed: words count as one token
+    per ~4 letters, every digit run and punctuation mark as one. Close enough to
+    Gemini's counts to size prompts.
+    """
+    return sum(math.ceil(len(p) / 4) if p[0].isalpha() else 1 for p in _PIECES.findall(text or ""))
+
+
+def _title_key(title: Optional[str]) -> frozenset:
+    return frozenset(re.findall(r"[a-z0-9]+", (title or "").lower()))
+
+
+def _near_duplicate(a: frozenset, b: frozenset, threshold: float = 0.9) -> bool:
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= threshold
+
+
+class ContextBudget:
+    """
+    Shrinks tool output before it is put into an LLM prompt:
+    - projects records down to the fields the next step needs
+    - drops duplicate urls and near-identical listings (same source, ~same title)
+    - truncates snippets and caps specs
+    - drops trailing records until the rendered JSON fits max_tokens
+    stats() reports the tokens saved so far.
+    """
+
+    def __init__(self, max_tokens: int = CONTEXT_TOKEN_BUDGET, snippet_chars: int = SNIPPET_CHARS):
+        self.max_tokens = max_tokens
+        self.snippet_chars = snippet_chars
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def _project(self, item: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+        out = {}
+        for field in fields:
+            value = item.get(field)
+            if value in (None, "", [], {}):
+                continue
+            if field == "snippet" and len(value) > self.snippet_chars:
+                value = value[:self.snippet_chars].rstrip() + "..."
+            elif field == "specs":
+                value = dict(list(value.items())[:MAX_SPECS])
+            out[field] = value
+        return out
+
+    def _dedupe(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        seen_urls = set()
+        seen_titles: List[Tuple[str, frozenset]] = []
+        out = []
+        for item in items:
+            url = item.get("url") or item.get("link")
+            key = normalize_url(url) if url else None
+            if key and key in seen_urls:
+                continue
+            title = _title_key(item.get("title"))
+            source = item.get("source")
+            if any(s == source and _near_duplicate(title, t) for s, t in seen_titles):
+                continue
+            if key:
+                seen_urls.add(key)
+            seen_titles.append((source, title))
+            out.append(item)
+        return out
+
+    def _fit(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        while len(items) > 1 and estimate_tokens(json.dumps(items)) > self.max_tokens:
+            items = items[:-1]
+        return items
+
+    def compress_items(self, items: List[Dict[str, Any]], fields: List[str]) -> List[Dict[str, Any]]:
+        return self._fit([self._project(item, fields) for item in self._dedupe(items)])
+
+    def compress(self, value: Any, fields: Optional[List[str]] = None) -> str:
+        """
+        Render a tool output (or any value) as prompt text within the budget.
+        fields overrides the projection picked from the shape of the records.
+        """
+        raw = value if isinstance(value, str) else json.dumps(value, default=str)
+
+        if isinstance(value, dict) and isinstance(value.get("results"), list):
+            items = value["results"]
+            if fields is None:
+                fields = PRODUCT_FIELDS if any("price" in i or "asin" in i for i in items) else LINK_FIELDS
+            compact = {k: v for k, v in value.items() if k != "results"}
+            compact["results"] = self.compress_items(items, fields)
+            text = json.dumps(compact, ensure_ascii=False, default=str)
+        elif isinstance(value, list) and all(isinstance(i, dict) for i in value):
+            text = json.dumps(self.compress_items(value, fields or LINK_FIELDS), ensure_ascii=False, default=str)
+        else:
+            text = raw
+
+        # last resort for free text or a single oversized record
+        limit = self.max_tokens * 4
+        if estimate_tokens(text) > self.max_tokens and len(text) > limit:
+            text = text[:limit] + "...[truncated]"
+
+        self._account(raw, text)
+        return text
+
+    def _account(self, before: str, after: str):
+        before_tokens, after_tokens = estimate_tokens(before), estimate_tokens(after)
+        with self._lock:
+            self.calls += 1
+            self.tokens_before += before_tokens
+            self.tokens_after += after_tokens
+        record("tokens_saved", before_tokens - after_tokens)
+
+    def format_scratchpad(self, intermediate_steps: List[Tuple[Any, Any]],
+                          observation_prefix: str = "Observation: ", llm_prefix: str = "Thought: ") -> str:
+        """ReAct scratchpad like langchain's format_log_to_str, with every observation compressed."""
+        thoughts = ""
+        for action, observation in intermediate_steps:
+            thoughts += action.log
+            thoughts += f"\n{observation_prefix}{self.compress(observation)}\n{llm_prefix}"
+        return thoughts
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+            }
@@ -0,0 +1,526 @@
+# cache.py
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import warnings
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Iterator, Tuple, Awaitable
+from urllib.parse import urlparse
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+from ids import normalize_url
+from metrics import record
+
+
+HTTP_CACHE_PATH = os.getenv("http_cache_path", os.path.join(".cache", "http_cache.sqlite"))
+HTTP_CACHE_TTL = float(os.getenv("http_cache_ttl", "3600"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("http_cache_max_bytes", str(256 * 1024 * 1024)))
+
+SEARCH_CACHE_PATH = os.getenv("search_cache_path", os.path.join(".cache", "search_cache.sqlite"))
+SEARCH_CACHE_TTL = float(os.getenv("search_cache_ttl", str(24 * 3600)))
+
+PRODUCT_INDEX_ENABLED = os.getenv("product_index", "1") not in ("0", "false", "False")
+PRODUCT_INDEX_PATH = os.getenv("product_index_path", os.path.join(".cache", "products.sqlite"))
+PRODUCT_INDEX_TTL = float(os.getenv("product_index_ttl", "1800"))
+
+LLM_CACHE_ENABLED = os.getenv("llm_cache", "1") not in ("0", "false", "False")
+LLM_CACHE_PATH = os.getenv("llm_cache_path", os.path.join(".cache", "llm_cache.sqlite"))
+LLM_CACHE_TTL = float(os.getenv("llm_cache_ttl", str(6 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("llm_cache_max_entries", "50000"))
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ResponseCache:
+    """
+    On-disk HTTP response cache keyed by normalized URL.
+    - per-domain TTL (domain_ttls = {"amazon.": 900, ...}, matched as substring of the host)
+    - stores ETag / Last-Modified so stale entries can be revalidated with a conditional request
+    - LRU eviction once the stored bodies exceed max_bytes
+    - hit / miss / revalidation counters via stats()
+    """
+
+    def __init__(self,
+                 path: str = HTTP_CACHE_PATH,
+                 default_ttl: float = HTTP_CACHE_TTL,
+                 domain_ttls: Optional[Dict[str, float]] = None,
+                 max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.domain_ttls = domain_ttls or {}
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                last_access REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def ttl_for(self, url: str) -> float:
+        host = urlparse(url).netloc.lower()
+        for domain, ttl in self.domain_ttls.items():
+            if domain in host:
+                return ttl
+        return self.default_ttl
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached entry (fresh or stale) or None.
+        entry["fresh"] tells the caller whether it may skip the network.
+        """
+        key = normalize_url(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+
+        status, headers, body, etag, last_modified, stored_at = row
+        fresh = now - stored_at < self.ttl_for(url)
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return {
+            "status": status,
+            "headers": json.loads(headers),
+            "content": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": stored_at,
+            "fresh": fresh,
+        }
+
+    def conditional_headers(self, entry: Dict[str, Any]) -> Dict[str, str]:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, status: int, headers: Dict[str, str], content: bytes):
+        key = normalize_url(url)
+        now = time.time()
+        lowered = {k.lower(): v for k, v in headers.items()}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, status, json.dumps(headers), content, len(content),
+                 lowered.get("etag"), lowered.get("last-modified"), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def touch(self, url: str):
+        """Mark a stale entry fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE responses SET stored_at = ?, last_access = ? WHERE key = ?",
+                               (now, now, normalize_url(url)))
+            self._conn.commit()
+            self.revalidated += 1
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            total -= row[1]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ProductIndex:
+    """
+    Persistent product identity index: canonical product id -> last extracted
+    record, its url and when it was extracted. Records older than ttl
+    (product_index_ttl, one value for every domain, independent of the response
+    cache TTLs) are treated as missing, so callers refetch them.
+    """
+
+    def __init__(self, path: str = PRODUCT_INDEX_PATH, ttl: float = PRODUCT_INDEX_TTL):
+        self.path = path
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                id TEXT PRIMARY KEY,
+                url TEXT,
+                record TEXT,
+                updated_at REAL
+            )""")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """The last record for product_id if it is still fresh, else None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record, updated_at FROM products WHERE id = ?", (product_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if time.time() - row[1] >= self.ttl:
+                self.stale += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, product_id: str, url: str, product: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)",
+                               (product_id, url, json.dumps(product, default=str), time.time()))
+            self._conn.commit()
+
+    def update(self, product_id: str, url: str, fields: Dict[str, Any], base: Dict[str, Any],
+               observed_at: float) -> bool:
+        """
+        Overlay fields observed at observed_at on the stored record (on base when there
+        is none). A record written after observed_at is newer than the fields and is
+        left alone, False is returned then.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT record, updated_at FROM products WHERE id = ?", (product_id,)).fetchone()
+            if row is not None and row[1] > observed_at:
+                return False
+            product = dict(json.loads(row[0]) if row else base, **fields)
+            self._conn.execute("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)",
+                               (product_id, url, json.dumps(product, default=str), time.time()))
+            self._conn.commit()
+        return True
+
+    def iter_records(self, batch_size: int = 1000) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Every (product_id, url, record), fresh or not, read in batches so the whole index never sits in memory."""
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, url, record FROM products WHERE id > ? ORDER BY id LIMIT ?",
+                    (last, batch_size)).fetchall()
+            if not rows:
+                return
+            for product_id, url, product in rows:
+                yield product_id, url, json.loads(product)
+            last = rows[-1][0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TTLCache:
+    """
+    Two tier key/value cache for JSON-serializable values.
+    - in-memory LRU tier bounded by max_entries
+    - optional persistent SQLite tier (path=None keeps it memory only)
+    Entries older than ttl seconds are treated as missing in both tiers.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 3600, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._conn = None
+        if path:
+            self._conn = _connect(path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, stored_at REAL)")
+            self._conn.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and now - item[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return item[0]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] < self.ttl:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                                   (key, json.dumps(value), now))
+                self._conn.commit()
+
+    def _remember(self, key: str, value: Any, stored_at: float):
+        self._memory[key] = (value, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key: the first caller runs fn,
+    every other caller with the same key waits and shares its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict[str, Any]] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"event": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not leader:
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["event"].set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaits of the same key share one call of fn()."""
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Future"] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is not None:
+            return await asyncio.shield(call)
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        try:
+            result = await fn()
+        except Exception as e:
+            call.set_exception(e)
+            # mark it retrieved, nobody may be waiting on this call
+            call.exception()
+            raise
+        except BaseException:
+            # cancelled leader: waiters are cancelled too rather than left hanging
+            call.cancel()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+
+def _normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split()).lower()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(BaseCache):
+    """
+    LangChain LLM cache persisted in SQLite, pass it as `cache=` to a chat model.
+    Keys combine the llm_string (model name, params, stop words, bound tool schema)
+    with the prompt; a miss on the exact prompt falls back to a whitespace/case
+    normalized prompt. Entries expire after ttl and the least recently used ones
+    are evicted beyond max_entries.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = _connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS generations (
+                key TEXT PRIMARY KEY,
+                normalized_key TEXT,
+                value TEXT,
+                stored_at REAL,
+                last_access REAL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS generations_normalized ON generations(normalized_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS generations_lru ON generations(last_access)")
+        self._conn.commit()
+
+        self.exact_hits = 0
+        self.normalized_hits = 0
+        self.misses = 0
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, value, stored_at FROM generations WHERE key = ?",
+                (_digest(llm_string, prompt),)).fetchone()
+            kind = "exact"
+            if row is None or now - row[2] >= self.ttl:
+                row = self._conn.execute(
+                    "SELECT key, value, stored_at FROM generations WHERE normalized_key = ? "
+                    "ORDER BY stored_at DESC LIMIT 1",
+                    (_digest(llm_string, _normalize_prompt(prompt)),)).fetchone()
+                kind = "normalized"
+
+            if row is None or now - row[2] >= self.ttl:
+                self.misses += 1
+                record("llm_cache_misses")
+                return None
+
+            self._conn.execute("UPDATE generations SET last_access = ? WHERE key = ?", (now, row[0]))
+            self._conn.commit()
+            if kind == "exact":
+                self.exact_hits += 1
+            else:
+                self.normalized_hits += 1
+        record("llm_cache_hits")
+        with warnings.catch_warnings():
+            # rows are our own serialized generations, not untrusted input
+            warnings.simplefilter("ignore")
+            return [loads(g) for g in json.loads(row[1])]
+
+    def update(self, prompt: str, llm_string: str, return_val: Any) -> None:
+        now = time.time()
+        value = json.dumps([dumps(g) for g in return_val])
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?)",
+                (_digest(llm_string, prompt), _digest(llm_string, _normalize_prompt(prompt)), value, now, now))
+            count = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM generations WHERE key IN "
+                    "(SELECT key FROM generations ORDER BY last_access LIMIT ?)", (count - self.max_entries,))
+            self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM generations")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.normalized_hits
+            lookups = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "normalized_hits": self.normalized_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,267 @@
+# checkpoint.py
+import os
+import time
+import sqlite3
+import atexit
+import asyncio
+import threading
+from typing import Dict, Any, Optional, Iterator, AsyncIterator, Sequence, Tuple, List
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    WRITES_IDX_MAP,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+
+CHECKPOINT_PATH = os.getenv("checkpoint_path", os.path.join(".cache", "checkpoints.sqlite"))
+CHECKPOINT_RETENTION = int(os.getenv("checkpoint_retention", "5"))
+# threads untouched for this many seconds are dropped whole on compaction (a week); 0 keeps them
+CHECKPOINT_MAX_AGE = float(os.getenv("checkpoint_max_age", str(7 * 24 * 3600)))
+
+
+def make_serde(allowed_types: Sequence[type] = ()) -> JsonPlusSerializer:
+    """Serializer that may restore the given state record types from checkpoints."""
+    try:
+        return JsonPlusSerializer(allowed_msgpack_modules=[(t.__module__, t.__name__) for t in allowed_types])
+    except TypeError:
+        # older langgraph releases restore any type and take no allow list
+        return JsonPlusSerializer()
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """
+    Durable LangGraph checkpointer backed by a single SQLite (WAL) file.
+    - every put() and put_writes() is committed before it returns, one transaction
+      per call: a task's writes are durable as soon as the task finishes, so a run
+      killed mid-step resumes without redoing the tasks that already completed
+      (and without paying for their searches again)
+    - only the newest `retention` checkpoints per thread are kept
+      (set_retention() overrides it per thread), older ones are compacted away
+    - threads with no checkpoint in the last max_age seconds are dropped whole, so
+      finished batch and service runs do not pile up; resuming works within that window
+    Nothing is held in process between calls.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH, retention: int = CHECKPOINT_RETENTION,
+                 compact_every: int = 64, max_age: float = CHECKPOINT_MAX_AGE,
+                 serde: Optional[JsonPlusSerializer] = None):
+        super().__init__(serde=serde)
+        self.path = path
+        self.retention = retention
+        self.compact_every = compact_every
+        self.max_age = max_age
+
+        self._lock = threading.RLock()
+        self._retention: Dict[str, int] = {}
+        self._dirty_threads = set()
+        self._puts = 0
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                created_at REAL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+        """)
+        self._conn.commit()
+        atexit.register(self.close)
+
+    def set_retention(self, thread_id: str, keep_last: int):
+        self._retention[thread_id] = keep_last
+
+    # --- write path -----------------------------------------------------------
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        type_, data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(dict(metadata))
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], configurable.get("checkpoint_id"),
+                     type_, data, metadata_type, metadata_data, time.time()))
+            self._dirty_threads.add(thread_id)
+            self._puts += 1
+            if self._puts % self.compact_every == 0:
+                self.compact(list(self._dirty_threads))
+                self._dirty_threads.clear()
+
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        configurable = config["configurable"]
+        rows = []
+        for i, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            rows.append((configurable["thread_id"], configurable.get("checkpoint_ns", ""),
+                         configurable["checkpoint_id"], task_id, WRITES_IDX_MAP.get(channel, i),
+                         channel, type_, data))
+        with self._lock, self._conn:
+            # special channels (errors, interrupts) replace, regular writes are idempotent
+            self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [row for row in rows if row[4] < 0])
+            self._conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [row for row in rows if row[4] >= 0])
+
+    def compact(self, thread_ids: Optional[List[str]] = None):
+        """
+        Drop all but the newest `retention` checkpoints (and their writes) of each thread,
+        and every thread older than max_age.
+        """
+        with self._lock:
+            if thread_ids is None:
+                thread_ids = [r[0] for r in self._conn.execute("SELECT DISTINCT thread_id FROM checkpoints")]
+            with self._conn:
+                if self.max_age > 0:
+                    expired = self._conn.execute(
+                        "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+                        (time.time() - self.max_age,)).fetchall()
+                    for (thread_id,) in expired:
+                        self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                        self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+                for thread_id in thread_ids:
+                    keep = self._retention.get(thread_id, self.retention)
+                    stale = self._conn.execute(
+                        "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? "
+                        "ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?", (thread_id, keep)).fetchall()
+                    for checkpoint_ns, checkpoint_id in stale:
+                        params = (thread_id, checkpoint_ns, checkpoint_id)
+                        self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                                           "AND checkpoint_id = ?", params)
+                        self._conn.execute("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                                           "AND checkpoint_id = ?", params)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    # --- read path ------------------------------------------------------------
+
+    def _tuple(self, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, data, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+            "AND checkpoint_id = ? ORDER BY task_id, idx", (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}},
+            checkpoint=self.serde.loads_typed((type_, data)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                            "checkpoint_id": parent_id}} if parent_id else None,
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        params = [configurable["thread_id"], configurable.get("checkpoint_ns", "")]
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?")
+        if configurable.get("checkpoint_id"):
+            query += " AND checkpoint_id = ?"
+            params.append(configurable["checkpoint_id"])
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            return self._tuple(row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                 "metadata_type, metadata FROM checkpoints WHERE 1 = 1")
+        params: List[Any] = []
+        if config:
+            configurable = config["configurable"]
+            query += " AND thread_id = ?"
+            params.append(configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(configurable["checkpoint_ns"])
+        if before:
+            query += " AND checkpoint_id < ?"
+            params.append(before["configurable"]["checkpoint_id"])
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            tuples = []
+            for row in rows:
+                item = self._tuple(row)
+                if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                    continue
+                tuples.append(item)
+                if limit is not None and len(tuples) >= limit:
+                    break
+        yield from tuples
+
+    # --- async variants run the sync implementation off the event loop --------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.close()
+            self._closed = True
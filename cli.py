@@ -0,0 +1,23 @@
+# cli.py
+"""
+Command line entry points:
+
+    python cli.py batch queries.txt -o results.ndjson
+    python cli.py refresh tracked.ndjson -o changes.ndjson
+    python cli.py service --port 8080
+
+Parse pool workers are spawned, and spawn re-runs the parent's main script in
+every worker (as __mp_main__). This file is that script, so it imports nothing
+outside __main__ and the workers load parsepool and extract only.
+"""
+
+COMMANDS = ("batch", "refresh", "service")
+
+
+if __name__ == "__main__":
+    import sys
+    import importlib
+
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        sys.exit(f"usage: python cli.py {{{','.join(COMMANDS)}}} [args...]")
+    importlib.import_module(sys.argv[1]).main(sys.argv[2:])
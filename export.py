@@ -0,0 +1,238 @@
+# export.py
+"""
+Bulk export of extracted product records.
+
+Products are flattened into one typed row each (PRODUCT_COLUMNS) and written in
+fixed-size row groups, so memory stays at one row group however long the run is:
+
+    with open_writer("products.parquet") as writer:
+        for result in run_batch(queries):
+            writer.write_result(result)
+
+    for row in read_records("products.parquet", columns=["product_id", "price"]):
+        ...
+
+The format follows the extension: .ndjson / .jsonl (appends), .arrow / .feather
+(Arrow IPC file) or .parquet. Arrow and Parquet need pyarrow and are read back
+through a memory map, so scans only touch the pages of the columns they ask for.
+"""
+import os
+import json
+import time
+from typing import List, Dict, Any, Optional, Iterator, Union
+
+from records import ProductRecord
+from ids import product_id
+
+
+# rows buffered before a row group (record batch) is written
+EXPORT_ROW_GROUP = int(os.getenv("export_row_group", "10000"))
+
+# (column, arrow type name); nested price / specs are split or kept as JSON text
+PRODUCT_COLUMNS = [
+    ("query", "string"),
+    ("product_id", "string"),
+    ("url", "string"),
+    ("source", "string"),
+    ("asin", "string"),
+    ("title", "string"),
+    ("price", "float64"),
+    ("currency", "string"),
+    ("availability", "string"),
+    ("rating", "float64"),
+    ("images", "list<string>"),
+    ("specs", "string"),
+    ("error", "string"),
+    ("extracted_at", "float64"),
+]
+
+_FORMATS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".arrow": "arrow", ".feather": "arrow",
+            ".parquet": "parquet"}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Arrow and Parquet export need pyarrow (pip install pyarrow), "
+                          "use an .ndjson path without it")
+    return pyarrow
+
+
+def arrow_schema():
+    pa = _pyarrow()
+    types = {"string": pa.string(), "float64": pa.float64(), "list<string>": pa.list_(pa.string())}
+    return pa.schema([(name, types[kind]) for name, kind in PRODUCT_COLUMNS])
+
+
+def product_row(product: Union[ProductRecord, Dict[str, Any]], query: Optional[str] = None,
+                extracted_at: Optional[float] = None) -> Dict[str, Any]:
+    """One flat, typed row per product; the same keys and types in every format."""
+    if isinstance(product, ProductRecord):
+        product = product.to_dict()
+    price = product.get("price") or {}
+    rating = product.get("rating")
+    url = product.get("url")
+    return {
+        "query": query,
+        "product_id": product_id(url) if url else None,
+        "url": url,
+        "source": product.get("source"),
+        "asin": product.get("asin"),
+        "title": product.get("title"),
+        "price": float(price["value"]) if price.get("value") is not None else None,
+        "currency": price.get("currency"),
+        "availability": product.get("availability"),
+        "rating": float(rating) if rating is not None else None,
+        "images": list(product.get("images") or []),
+        "specs": json.dumps(product["specs"], ensure_ascii=False, default=str) if product.get("specs") else None,
+        "error": product.get("error"),
+        "extracted_at": extracted_at if extracted_at is not None else time.time(),
+    }
+
+
+def export_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _FORMATS:
+        raise ValueError(f"unknown export format for {path}, use one of {', '.join(sorted(_FORMATS))}")
+    return _FORMATS[ext]
+
+
+class RecordWriter:
+    """
+    Buffers product rows and writes them a row group at a time.
+    write() takes a ProductRecord or product dict, write_result() every product of
+    a run_scraping_agent / run_batch result. Use as a context manager or call close().
+    """
+
+    def __init__(self, path: str, row_group: int = EXPORT_ROW_GROUP):
+        self.path = path
+        self.row_group = row_group
+        self.rows_written = 0
+        self._rows: List[Dict[str, Any]] = []
+
+    def write(self, product: Union[ProductRecord, Dict[str, Any]], query: Optional[str] = None):
+        self._rows.append(product_row(product, query))
+        if len(self._rows) >= self.row_group:
+            self.flush()
+
+    def write_result(self, result: Dict[str, Any]):
+        query = result.get("query") or (result.get("link_results") or {}).get("query")
+        for product in (result.get("details_results") or {}).get("products", []):
+            self.write(product, query)
+
+    def flush(self):
+        if self._rows:
+            self._write_rows(self._rows)
+            self.rows_written += len(self._rows)
+            self._rows = []
+
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NDJSONWriter(RecordWriter):
+    """One JSON row per line, appended to the file."""
+
+    def __init__(self, path: str, row_group: int = EXPORT_ROW_GROUP):
+        super().__init__(path, row_group)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+        self._file.flush()
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class ArrowWriter(RecordWriter):
+    """Arrow IPC file, one record batch per row group. Always a new file."""
+
+    def __init__(self, path: str, row_group: int = EXPORT_ROW_GROUP):
+        super().__init__(path, row_group)
+        pa = _pyarrow()
+        self._pa = pa
+        self._schema = arrow_schema()
+        self._sink = pa.OSFile(path, "wb")
+        self._writer = pa.ipc.new_file(self._sink, self._schema)
+
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        self._writer.write_batch(self._pa.RecordBatch.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        super().close()
+        self._writer.close()
+        self._sink.close()
+
+
+class ParquetWriter(RecordWriter):
+    """Parquet file, one row group per flush. Always a new file."""
+
+    def __init__(self, path: str, row_group: int = EXPORT_ROW_GROUP, compression: str = "zstd"):
+        super().__init__(path, row_group)
+        pa = _pyarrow()
+        self._pa = pa
+        self._schema = arrow_schema()
+        self._writer = pa.parquet.ParquetWriter(path, self._schema, compression=compression)
+
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema),
+                                 row_group_size=len(rows))
+
+    def close(self):
+        super().close()
+        self._writer.close()
+
+
+_WRITERS = {"ndjson": NDJSONWriter, "arrow": ArrowWriter, "parquet": ParquetWriter}
+
+
+def open_writer(path: str, row_group: int = EXPORT_ROW_GROUP) -> RecordWriter:
+    return _WRITERS[export_format(path)](path, row_group)
+
+
+def read_batches(path: str, columns: Optional[List[str]] = None, batch_size: int = EXPORT_ROW_GROUP):
+    """Arrow record batches of an .arrow or .parquet export, read through a memory map."""
+    pa = _pyarrow()
+    fmt = export_format(path)
+    if fmt == "arrow":
+        with pa.memory_map(path, "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                yield batch.select(columns) if columns else batch
+    elif fmt == "parquet":
+        parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+        try:
+            yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+        finally:
+            parquet_file.close()
+    else:
+        raise ValueError(f"{path} is not a columnar export, use read_records")
+
+
+def read_records(path: str, columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Rows of any export as dicts, one row group in memory at a time."""
+    if export_format(path) == "ndjson":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield {name: row.get(name) for name in columns} if columns else row
+        return
+
+    for batch in read_batches(path, columns):
+        yield from batch.to_pylist()
@@ -0,0 +1,414 @@
+# extract.py
+import re
+import json
+import codecs
+from html.parser import HTMLParser
+from typing import List, Dict, Any, Optional, Tuple
+from bs4 import BeautifulSoup
+
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+FIELDS = ["title", "price", "availability", "images", "specs", "rating"]
+
+CURRENCY_SYMBOLS = {"₹": "INR", "Rs.": "INR", "Rs": "INR", "$": "USD", "£": "GBP", "€": "EUR", "¥": "JPY"}
+
+# per-marketplace CSS selectors, keys match ids.ALLOWED_DOMAINS
+SELECTORS = {
+    "amazon.": {
+        "title": ["#productTitle", "#title"],
+        "price": [".a-price .a-offscreen", "#priceblock_ourprice", "#priceblock_dealprice", "#corePrice_feature_div .a-offscreen"],
+        "availability": ["#availability span", "#availability"],
+        "rating": ["#acrPopover", "span[data-hook=rating-out-of-text]", "i.a-icon-star span"],
+        "images": ["#landingImage", "#imgTagWrapperId img"],
+        "specs": ["#productDetails_techSpec_section_1 tr", "#productDetails_detailBullets_sections1 tr", "#prodDetails tr"],
+    },
+    "flipkart.": {
+        "title": ["span.B_NuCI", "span.VU-ZEz", "h1 span"],
+        "price": ["div._30jeq3._16Jk6d", "div.Nx9bqj.CxhGGd", "div._30jeq3"],
+        "availability": ["div._16FRp0", "div.Z8JjpR"],
+        "rating": ["div._3LWZlK", "div.XQDdHH"],
+        "images": ["img._396cs4", "img.DByuf4"],
+        "specs": ["table._14cfVK tr", "table._0ZhAN9 tr"],
+    },
+    "ebay.": {
+        "title": ["h1.x-item-title__mainTitle span", "h1#itemTitle"],
+        "price": [".x-price-primary span", "#prcIsum", ".x-bin-price__content span"],
+        "availability": ["#qtySubTxt", ".d-quantity__availability span"],
+        "rating": [".ux-seller-section__item--seller a span", "span.review--start--rating"],
+        "images": [".ux-image-carousel-item img", "#icImg"],
+        "specs": [".ux-layout-section-evo__col"],
+    },
+    "walmart.": {
+        "title": ["h1[itemprop=name]", "h1#main-title"],
+        "price": ["span[itemprop=price]", "[data-testid=price-wrap] span"],
+        "availability": ["[data-testid=add-to-cart-section] span", "div.prod-ProductOffer-oosMsg"],
+        "rating": [".rating-number", "span[itemprop=ratingValue]"],
+        "images": ["[data-testid=hero-image] img", "img.db"],
+        "specs": ["[data-testid=product-specifications] div.pb2"],
+    },
+    "bestbuy.": {
+        "title": [".sku-title h1", "h1.heading-5"],
+        "price": [".priceView-customer-price span", "[data-testid=customer-price] span"],
+        "availability": ["button.add-to-cart-button", ".fulfillment-add-to-cart-button button"],
+        "rating": [".ugc-c-review-average", "span.c-review-average"],
+        "images": ["img.primary-image", ".shop-media-gallery img"],
+        "specs": [".specifications-listing li", ".spec-table tr"],
+    },
+}
+
+
+def _clean(txt: Optional[str]) -> Optional[str]:
+    if not txt:
+        return None
+    txt = " ".join(str(txt).split())
+    return txt or None
+
+
+def parse_price(value: Any, currency: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """'₹1,29,900.00' -> {"value": 129900.0, "currency": "INR"}"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return {"value": float(value), "currency": currency}
+
+    text = str(value)
+    if not currency:
+        for symbol, code in CURRENCY_SYMBOLS.items():
+            if symbol in text:
+                currency = code
+                break
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", text)
+    if not match:
+        return None
+    try:
+        return {"value": float(match.group(0).replace(",", "")), "currency": currency}
+    except ValueError:
+        return None
+
+
+def parse_rating(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    match = re.search(r"\d+(?:\.\d+)?", str(value))
+    if not match:
+        return None
+    rating = float(match.group(0))
+    return rating if 0 <= rating <= 5 else None
+
+
+def normalize_availability(value: Any) -> Optional[str]:
+    text = _clean(value)
+    if not text:
+        return None
+    lowered = text.lower().replace(" ", "").replace("_", "")
+    if "outofstock" in lowered or "soldout" in lowered or "unavailable" in lowered or "discontinued" in lowered:
+        return "Out of stock"
+    if "instock" in lowered or "addtocart" in lowered or "available" in lowered or "limitedavailability" in lowered:
+        return "In Stock"
+    return text
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _merge(record: Dict[str, Any], found: Dict[str, Any]):
+    """Fill fields that are still empty, higher priority sources are merged first."""
+    for field in FIELDS:
+        if field == "specs" and found.get("specs"):
+            record["specs"] = {**found["specs"], **(record.get("specs") or {})}
+        elif not record.get(field) and found.get(field):
+            record[field] = found[field]
+
+
+def merge_fields(fields: Dict[str, Any], found: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of fields with every field it left empty filled from found."""
+    record = dict(fields)
+    _merge(record, found)
+    return record
+
+
+# --- schema.org JSON-LD -----------------------------------------------------
+
+def _iter_jsonld_nodes(data: Any):
+    for node in _as_list(data):
+        if not isinstance(node, dict):
+            continue
+        yield node
+        if "@graph" in node:
+            yield from _iter_jsonld_nodes(node["@graph"])
+
+
+def _is_product(node: Dict[str, Any]) -> bool:
+    types = [str(t).lower() for t in _as_list(node.get("@type"))]
+    return any(t in ("product", "productgroup", "individualproduct") for t in types)
+
+
+def _image_urls(value: Any) -> List[str]:
+    urls = []
+    for img in _as_list(value):
+        if isinstance(img, dict):
+            img = img.get("url") or img.get("contentUrl")
+        if img:
+            urls.append(str(img))
+    return urls
+
+
+def from_jsonld_data(data: Any) -> Dict[str, Any]:
+    """Extract product fields from already parsed JSON-LD data."""
+    for node in _iter_jsonld_nodes(data):
+        if not _is_product(node):
+            continue
+
+        found: Dict[str, Any] = {"title": _clean(node.get("name")), "images": _image_urls(node.get("image"))}
+
+        offers = _as_list(node.get("offers"))
+        if offers and isinstance(offers[0], dict):
+            offer = offers[0]
+            price = offer.get("price") or offer.get("lowPrice")
+            if price is None and isinstance(offer.get("priceSpecification"), dict):
+                price = offer["priceSpecification"].get("price")
+            found["price"] = parse_price(price, offer.get("priceCurrency"))
+            found["availability"] = normalize_availability(offer.get("availability"))
+
+        rating = node.get("aggregateRating")
+        if isinstance(rating, dict):
+            found["rating"] = parse_rating(rating.get("ratingValue"))
+
+        specs = {}
+        for prop in _as_list(node.get("additionalProperty")):
+            if isinstance(prop, dict) and prop.get("name"):
+                specs[_clean(prop["name"])] = _clean(prop.get("value"))
+        for key in ("brand", "model", "color", "sku", "gtin13", "mpn"):
+            value = node.get(key)
+            if isinstance(value, dict):
+                value = value.get("name")
+            if value:
+                specs.setdefault(key, _clean(value))
+        found["specs"] = specs
+        return found
+    return {}
+
+
+def from_jsonld(soup: BeautifulSoup) -> Dict[str, Any]:
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or script.get_text() or "")
+        except (ValueError, TypeError):
+            continue
+        found = from_jsonld_data(data)
+        if found:
+            return found
+    return {}
+
+
+# --- schema.org microdata ---------------------------------------------------
+
+def _itemprop(scope, name: str) -> Optional[str]:
+    el = scope.find(attrs={"itemprop": name})
+    if el is None:
+        return None
+    return el.get("content") or el.get("href") or el.get("src") or el.get_text()
+
+
+def from_microdata(soup: BeautifulSoup) -> Dict[str, Any]:
+    scope = soup.find(attrs={"itemtype": re.compile(r"schema\.org/Product", re.I)})
+    if scope is None:
+        return {}
+
+    image = _itemprop(scope, "image")
+    return {
+        "title": _clean(_itemprop(scope, "name")),
+        "price": parse_price(_itemprop(scope, "price"), _clean(_itemprop(scope, "priceCurrency"))),
+        "availability": normalize_availability(_itemprop(scope, "availability")),
+        "rating": parse_rating(_itemprop(scope, "ratingValue")),
+        "images": [image] if image else [],
+    }
+
+
+# --- OpenGraph --------------------------------------------------------------
+
+def _meta(soup: BeautifulSoup, *names: str) -> Optional[str]:
+    for name in names:
+        el = soup.find("meta", attrs={"property": name}) or soup.find("meta", attrs={"name": name})
+        if el is not None and el.get("content"):
+            return el["content"]
+    return None
+
+
+def from_opengraph(soup: BeautifulSoup) -> Dict[str, Any]:
+    image = _meta(soup, "og:image", "og:image:secure_url")
+    return {
+        "title": _clean(_meta(soup, "og:title", "twitter:title")),
+        "price": parse_price(_meta(soup, "product:price:amount", "og:price:amount"),
+                             _meta(soup, "product:price:currency", "og:price:currency")),
+        "availability": normalize_availability(_meta(soup, "product:availability", "og:availability")),
+        "images": [image] if image else [],
+    }
+
+
+# --- marketplace selectors --------------------------------------------------
+
+def _select_text(soup: BeautifulSoup, selectors: List[str]) -> Optional[str]:
+    for selector in selectors:
+        el = soup.select_one(selector)
+        if el is None:
+            continue
+        text = _clean(el.get("title") or el.get("value") or el.get_text())
+        if text:
+            return text
+    return None
+
+
+def _select_specs(soup: BeautifulSoup, selectors: List[str]) -> Dict[str, str]:
+    specs = {}
+    for selector in selectors:
+        for row in soup.select(selector):
+            cells = row.find_all(["th", "td", "dt", "dd", "span", "div"], recursive=False) or row.find_all(["th", "td"])
+            if len(cells) >= 2:
+                key, value = _clean(cells[0].get_text()), _clean(cells[1].get_text())
+                if key and value:
+                    specs[key] = value
+        if specs:
+            break
+    return specs
+
+
+def from_selectors(soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    host = url.lower()
+    selectors = next((sel for domain, sel in SELECTORS.items() if domain in host), None)
+    if selectors is None:
+        return {}
+
+    images = []
+    for selector in selectors["images"]:
+        el = soup.select_one(selector)
+        src = el and (el.get("data-old-hires") or el.get("src"))
+        if src:
+            images.append(src)
+            break
+
+    return {
+        "title": _select_text(soup, selectors["title"]),
+        "price": parse_price(_select_text(soup, selectors["price"])),
+        "availability": normalize_availability(_select_text(soup, selectors["availability"])),
+        "rating": parse_rating(_select_text(soup, selectors["rating"])),
+        "images": images,
+        "specs": _select_specs(soup, selectors["specs"]),
+    }
+
+
+def extract_product(soup: BeautifulSoup, url: str) -> Dict[str, Any]:
+    """
+    Deterministic product extraction, no LLM involved.
+    Sources in priority order: JSON-LD, microdata, OpenGraph, marketplace selectors.
+    Missing fields stay None / empty, nothing is guessed.
+    """
+    record: Dict[str, Any] = {"title": None, "price": None, "availability": None,
+                              "images": [], "specs": {}, "rating": None}
+    for source in (from_jsonld(soup), from_microdata(soup), from_opengraph(soup), from_selectors(soup, url)):
+        _merge(record, source)
+
+    if not record["title"] and soup.title:
+        record["title"] = _clean(soup.title.get_text())
+    return record
+
+
+def parse_html(content: bytes, url: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Full parse of a product page: extracted fields plus the meta description."""
+    soup = BeautifulSoup(content, HTML_PARSER)
+    description = soup.find("meta", attrs={"name": "description"})
+    return extract_product(soup, url), description.get("content") if description else None
+
+
+# --- streaming scanner ------------------------------------------------------
+
+class StreamingScanner(HTMLParser):
+    """
+    Incremental scanner fed with raw response chunks while the page downloads.
+    Collects <title>, <meta> tags and JSON-LD blocks and reports complete once
+    every required field (title and price by default) is known, so the fetcher
+    can stop reading the body.
+    """
+
+    def __init__(self, required: Tuple[str, ...] = ("title", "price")):
+        super().__init__(convert_charrefs=True)
+        self.required = required
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._in_title = False
+        self._in_jsonld = False
+        self._buf: List[str] = []
+        self.title: Optional[str] = None
+        self.meta: Dict[str, str] = {}
+        self.jsonld: Dict[str, Any] = {}
+        self.complete = False
+
+    def feed_bytes(self, chunk: bytes) -> bool:
+        """Feed one chunk, returns True once the required fields have been found."""
+        if not self.complete:
+            self.feed(self._decoder.decode(chunk))
+        return self.complete
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "title" and self.title is None:
+            self._in_title = True
+            self._buf = []
+        elif tag == "script" and (attrs.get("type") or "").lower() == "application/ld+json":
+            self._in_jsonld = True
+            self._buf = []
+        elif tag == "meta":
+            key = attrs.get("property") or attrs.get("name") or attrs.get("itemprop")
+            if key and attrs.get("content") and key not in self.meta:
+                self.meta[key] = attrs["content"]
+                self._check()
+
+    def handle_data(self, data):
+        if self._in_title or self._in_jsonld:
+            self._buf.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = _clean("".join(self._buf))
+            self._check()
+        elif tag == "script" and self._in_jsonld:
+            self._in_jsonld = False
+            if not self.jsonld:
+                try:
+                    self.jsonld = from_jsonld_data(json.loads("".join(self._buf)))
+                except (ValueError, TypeError):
+                    pass
+            self._check()
+
+    def _meta_fields(self) -> Dict[str, Any]:
+        image = self.meta.get("og:image")
+        return {
+            "title": _clean(self.meta.get("og:title")) or self.title,
+            "price": parse_price(self.meta.get("product:price:amount") or self.meta.get("og:price:amount")
+                                 or self.meta.get("price"),
+                                 self.meta.get("product:price:currency") or self.meta.get("og:price:currency")
+                                 or self.meta.get("priceCurrency")),
+            "availability": normalize_availability(self.meta.get("product:availability")
+                                                   or self.meta.get("og:availability")
+                                                   or self.meta.get("availability")),
+            "images": [image] if image else [],
+        }
+
+    def _check(self):
+        fields = self.fields()
+        self.complete = all(fields[name] for name in self.required)
+
+    def fields(self) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"title": None, "price": None, "availability": None,
+                                  "images": [], "specs": {}, "rating": None}
+        _merge(record, self.jsonld)
+        _merge(record, self._meta_fields())
+        return record
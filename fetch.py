@@ -0,0 +1,500 @@
+# fetch.py
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import ResponseCache
+from metrics import record, get_logger
+from ratelimit import DomainScheduler
+from resilience import CircuitBreaker, RetryPolicy, CIRCUIT_OPEN, classify_status, classify_exception
+
+
+logger = get_logger(__name__)
+
+MAX_CONCURRENCY = int(os.getenv("fetch_max_concurrency", "16"))
+PER_DOMAIN_CONCURRENCY = int(os.getenv("fetch_per_domain_concurrency", "4"))
+CONNECT_TIMEOUT = float(os.getenv("fetch_connect_timeout", "5"))
+READ_TIMEOUT = float(os.getenv("fetch_read_timeout", "15"))
+STREAM_MAX_BYTES = int(os.getenv("fetch_max_bytes", str(768 * 1024)))
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def _result(url: str, status: Optional[int], headers: Dict[str, str],
+            content: bytes, start: float, from_cache: bool = False) -> Dict[str, Any]:
+    ok = status is not None and 200 <= status < 400
+    return {
+        "url": url,
+        "status": status,
+        "headers": headers,
+        "content": content,
+        "elapsed": time.perf_counter() - start,
+        "from_cache": from_cache,
+        "truncated": False,
+        "error": None if ok else f"HTTP {status}",
+        "error_class": classify_status(status),
+    }
+
+
+def _failed(url: str, start: float, error: str, error_class: str) -> Dict[str, Any]:
+    result = _result(url, None, {}, b"", start)
+    result["error"] = error
+    result["error_class"] = error_class
+    return result
+
+
+class _HedgeLost(Exception):
+    """Raised in the copy of a hedged request that the other copy beat to the body."""
+
+
+class _BodyGate:
+    """
+    Hands a streaming consumer to whichever copy of a hedged request reaches the
+    body first; the other copy gets _HedgeLost on its first chunk and stops reading.
+    """
+
+    def __init__(self, consumer: Callable[[bytes], bool]):
+        self._consumer = consumer
+        self._owner: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def claimed(self) -> bool:
+        return self._owner is not None
+
+    def feed(self, copy: int) -> Callable[[bytes], bool]:
+        def feed(chunk: bytes) -> bool:
+            with self._lock:
+                if self._owner is None:
+                    self._owner = copy
+            if self._owner != copy:
+                raise _HedgeLost()
+            return self._consumer(chunk)
+        return feed
+
+
+def _better(result: Optional[Dict[str, Any]], other: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The result of a hedged pair to return: a success over an error, the first one otherwise."""
+    if result is None or (result["error"] and other is not None and not other["error"]):
+        return other
+    return result
+
+
+class PageFetcher:
+    """
+    Bounded thread-pool fetch engine.
+    - global concurrency limit shared by every batch
+    - per-host concurrency limit
+    - one keep-alive requests.Session (connection pool) per host
+    - per-request (connect, read) timeout
+    - optional streaming mode that stops reading once a consumer has what it needs
+    - optional ResponseCache: fresh entries skip the network, stale ones are revalidated
+    - optional DomainScheduler: per-domain rate limit, fed back with every response
+    - optional RetryPolicy: transient failures (timeouts, resets, 5xx) are retried
+      with jittered backoff, unless the consumer already saw part of the body
+    - optional CircuitBreaker: per-domain, fails fast while a marketplace is down
+    - optional hedging: a request with no body after hedge_after seconds gets a
+      duplicate (through the same scheduler and per-domain limits); the first copy
+      to reach the body is streamed to the consumer, the other stops
+    Every result carries an error_class (see resilience), None on success.
+    fetch_all() returns results in input order.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 per_domain: int = PER_DOMAIN_CONCURRENCY,
+                 timeout: tuple = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 headers: Optional[Dict[str, str]] = None,
+                 cache: Optional[ResponseCache] = None,
+                 scheduler: Optional[DomainScheduler] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 hedge_after: float = 0.0):
+        self.cache = cache
+        self.scheduler = scheduler
+        self.retry = retry
+        self.breaker = breaker
+        self.hedge_after = hedge_after
+        self.max_concurrency = max_concurrency
+        self.per_domain = per_domain
+        self.timeout = timeout
+        self.headers = headers or {}
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency,
+                                            thread_name_prefix="fetch")
+        # both copies of every hedged request, kept apart so they never wait behind the fetches they serve
+        self._hedge_executor = ThreadPoolExecutor(max_workers=2 * max_concurrency,
+                                                  thread_name_prefix="fetch-hedge") if hedge_after > 0 else None
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._domain_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _session(self, host: str) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_domain)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(self.headers)
+                self._sessions[host] = session
+            return session
+
+    def _domain_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._domain_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_domain)
+                self._domain_slots[host] = slot
+            return slot
+
+    def fetch(self, url: str,
+              consumer: Optional[Callable[[bytes], bool]] = None,
+              max_bytes: Optional[int] = None,
+              revalidate: bool = False) -> Dict[str, Any]:
+        """
+        Fetch a single url. Never raises, errors are reported in the result.
+        With a consumer the body is streamed: every chunk is passed to consumer(chunk)
+        and reading stops as soon as it returns True or max_bytes have been read.
+        revalidate=True sends a conditional request even for a fresh cache entry, so
+        from_cache in the result then means the server answered 304 Not Modified.
+        """
+        start = time.perf_counter()
+
+        cached = self.cache.get(url) if self.cache else None
+        if cached and cached["fresh"] and not revalidate:
+            if consumer:
+                consumer(cached["content"])
+            return _result(url, cached["status"], cached["headers"], cached["content"],
+                                start, from_cache=True)
+
+        key = self.scheduler.domain_key(url) if self.scheduler else _host(url)
+        attempt = 0
+        while True:
+            if self.breaker and not self.breaker.allow(key):
+                return _failed(url, start, f"circuit for {key} is open", CIRCUIT_OPEN)
+            fed = [False]
+
+            def feed(chunk: bytes) -> bool:
+                fed[0] = True
+                return consumer(chunk)
+
+            try:
+                result = self._fetch_hedged(url, feed if consumer else None, max_bytes, cached, start)
+            except BaseException:
+                # interrupted or cancelled: free a half-open probe
+                if self.breaker:
+                    self.breaker.release(key)
+                raise
+            if self.breaker:
+                self.breaker.report(key, result["error_class"])
+            # a consumer that saw part of a body cannot be fed a second one
+            if fed[0] or not self.retry or not self.retry.should_retry(result["error_class"], attempt):
+                return result
+            record("retries")
+            logger.info(f"retrying {url} after {result['error']}")
+            time.sleep(self.retry.delay(attempt))
+            attempt += 1
+
+    def _fetch_hedged(self, url: str, consumer: Optional[Callable[[bytes], bool]], max_bytes: Optional[int],
+                      cached: Optional[Dict[str, Any]], start: float) -> Dict[str, Any]:
+        """_fetch_once, with a second copy started when the first has no body after hedge_after seconds."""
+        if self._hedge_executor is None:
+            return self._fetch_once(url, consumer, max_bytes, cached, start)
+
+        gate = _BodyGate(consumer) if consumer else None
+
+        def copy(index: int) -> Future:
+            return self._hedge_executor.submit(contextvars.copy_context().run, self._fetch_once, url,
+                                               gate.feed(index) if gate else None, max_bytes, cached, start)
+
+        # both copies run on the hedge pool so this thread can return whichever finishes first;
+        # a thread cannot be cancelled, the losing copy stops at its first chunk or its timeout
+        pending = {copy(0)}
+        done, pending = wait(pending, timeout=self.hedge_after)
+        if not done and not (gate and gate.claimed):
+            record("hedged_requests")
+            pending.add(copy(1))
+        result = None
+        while True:
+            for future in done:
+                result = _better(result, future.result())
+            if not pending or (result is not None and not result["error"]):
+                return result
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def _fetch_once(self, url: str, consumer: Optional[Callable[[bytes], bool]], max_bytes: Optional[int],
+                    cached: Optional[Dict[str, Any]], start: float) -> Optional[Dict[str, Any]]:
+        """One request; None when it was the losing copy of a hedged pair."""
+        host = _host(url)
+        try:
+            headers = self.cache.conditional_headers(cached) if cached else {}
+            if self.scheduler:
+                self.scheduler.acquire(url)
+            with self._domain_slot(host):
+                resp = self._session(host).get(url, headers=headers, timeout=self.timeout,
+                                               stream=consumer is not None)
+                if self.scheduler:
+                    self.scheduler.report(url, resp.status_code, time.perf_counter() - start,
+                                          resp.headers.get("Retry-After"))
+                try:
+                    if cached and resp.status_code == 304:
+                        self.cache.touch(url)
+                        if consumer:
+                            consumer(cached["content"])
+                        return _result(url, cached["status"], cached["headers"], cached["content"],
+                                            start, from_cache=True)
+
+                    if consumer is None or resp.status_code >= 400:
+                        # error pages are not worth scanning, and the consumer stays clean for a retry
+                        content, truncated = resp.content, False
+                    else:
+                        content, truncated = self._read_stream(resp, consumer, max_bytes or STREAM_MAX_BYTES)
+                finally:
+                    resp.close()
+
+            # a truncated body still holds everything the consumer needed, so it is cached as is
+            if self.cache and resp.status_code == 200:
+                self.cache.put(url, resp.status_code, dict(resp.headers), content)
+            result = _result(url, resp.status_code, dict(resp.headers), content, start)
+            result["truncated"] = truncated
+            return result
+        except _HedgeLost:
+            return None
+        except Exception as e:
+            logger.warning(f"fetch failed for {url}: {str(e)}")
+            if self.scheduler and not isinstance(e, TimeoutError):
+                self.scheduler.report(url, None, time.perf_counter() - start)
+            return _failed(url, start, str(e), classify_exception(e))
+
+    def _read_stream(self, resp: requests.Response, consumer: Callable[[bytes], bool],
+                     max_bytes: int) -> Tuple[bytes, bool]:
+        chunks = []
+        read = 0
+        for chunk in resp.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            chunks.append(chunk)
+            read += len(chunk)
+            if consumer(chunk) or read >= max_bytes:
+                # stop early, closing the response drops the rest of the body
+                return b"".join(chunks), True
+        return b"".join(chunks), False
+
+    def fetch_all(self, urls: List[str],
+                  consumer_factory: Optional[Callable[[str], Callable[[bytes], bool]]] = None,
+                  max_bytes: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch all urls concurrently, results are returned in input order.
+        consumer_factory(url) builds one streaming consumer per url (see fetch()).
+        """
+        futures = [self.submit(url, consumer_factory(url) if consumer_factory else None, max_bytes)
+                   for url in urls]
+        return [f.result() for f in futures]
+
+    def submit(self, url: str, consumer: Optional[Callable[[bytes], bool]] = None,
+               max_bytes: Optional[int] = None, revalidate: bool = False) -> Future:
+        """Start fetching url in the background, the future resolves to the fetch() result."""
+        # run in a copy of the caller's context, so retries are counted on the caller's span
+        return self._executor.submit(contextvars.copy_context().run, self.fetch, url, consumer, max_bytes,
+                                     revalidate)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class AsyncPageFetcher:
+    """
+    PageFetcher for the event loop, on one shared aiohttp connection pool:
+    - global and per-host connection limits (TCPConnector limit / limit_per_host)
+    - same streaming, ResponseCache, DomainScheduler, RetryPolicy, CircuitBreaker and
+      hedging behaviour as PageFetcher, cache lookups and writes run in a thread so the
+      loop never waits on SQLite
+    The session is bound to the loop that first uses it and rebuilt for a new loop.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = MAX_CONCURRENCY,
+                 per_domain: int = PER_DOMAIN_CONCURRENCY,
+                 timeout: tuple = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                 headers: Optional[Dict[str, str]] = None,
+                 cache: Optional[ResponseCache] = None,
+                 scheduler: Optional[DomainScheduler] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 hedge_after: float = 0.0):
+        self.cache = cache
+        self.scheduler = scheduler
+        self.retry = retry
+        self.breaker = breaker
+        self.hedge_after = hedge_after
+        self.max_concurrency = max_concurrency
+        self.per_domain = per_domain
+        self.timeout = timeout
+        self.headers = headers or {}
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            stale, stale_loop = self._session, self._loop
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_domain)
+            self._session = aiohttp.ClientSession(
+                connector=connector, headers=self.headers,
+                timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1]))
+            self._loop = loop
+            if stale is not None and not stale.closed:
+                # the session of a previous loop: close it there while that loop still runs
+                if stale_loop is not None and stale_loop.is_running():
+                    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(stale.close(), stale_loop))
+                else:
+                    await stale.close()
+        return self._session
+
+    async def fetch(self, url: str,
+                    consumer: Optional[Callable[[bytes], bool]] = None,
+                    max_bytes: Optional[int] = None,
+                    revalidate: bool = False) -> Dict[str, Any]:
+        """Async fetch(), see PageFetcher.fetch. Never raises."""
+        start = time.perf_counter()
+
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache else None
+        if cached and cached["fresh"] and not revalidate:
+            if consumer:
+                consumer(cached["content"])
+            return _result(url, cached["status"], cached["headers"], cached["content"],
+                           start, from_cache=True)
+
+        key = self.scheduler.domain_key(url) if self.scheduler else _host(url)
+        attempt = 0
+        while True:
+            if self.breaker and not self.breaker.allow(key):
+                return _failed(url, start, f"circuit for {key} is open", CIRCUIT_OPEN)
+            fed = [False]
+
+            def feed(chunk: bytes) -> bool:
+                fed[0] = True
+                return consumer(chunk)
+
+            try:
+                result = await self._fetch_hedged(url, feed if consumer else None, max_bytes, cached, start)
+            except BaseException:
+                # interrupted or cancelled: free a half-open probe
+                if self.breaker:
+                    self.breaker.release(key)
+                raise
+            if self.breaker:
+                self.breaker.report(key, result["error_class"])
+            if fed[0] or not self.retry or not self.retry.should_retry(result["error_class"], attempt):
+                return result
+            record("retries")
+            logger.info(f"retrying {url} after {result['error']}")
+            await asyncio.sleep(self.retry.delay(attempt))
+            attempt += 1
+
+    async def _fetch_hedged(self, url: str, consumer: Optional[Callable[[bytes], bool]],
+                            max_bytes: Optional[int], cached: Optional[Dict[str, Any]],
+                            start: float) -> Dict[str, Any]:
+        """_fetch_hedged() of PageFetcher on the loop; copies still running when it returns are cancelled."""
+        if self.hedge_after <= 0:
+            return await self._fetch_once(url, consumer, max_bytes, cached, start)
+
+        gate = _BodyGate(consumer) if consumer else None
+        pending = {asyncio.ensure_future(self._fetch_once(url, gate.feed(0) if gate else None,
+                                                          max_bytes, cached, start))}
+        result = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_after)
+            if not done and not (gate and gate.claimed):
+                record("hedged_requests")
+                pending.add(asyncio.ensure_future(self._fetch_once(url, gate.feed(1) if gate else None,
+                                                                   max_bytes, cached, start)))
+            while True:
+                for task in done:
+                    result = _better(result, task.result())
+                if not pending or (result is not None and not result["error"]):
+                    return result
+                done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _fetch_once(self, url: str, consumer: Optional[Callable[[bytes], bool]], max_bytes: Optional[int],
+                          cached: Optional[Dict[str, Any]], start: float) -> Optional[Dict[str, Any]]:
+        try:
+            headers = self.cache.conditional_headers(cached) if cached else {}
+            if self.scheduler:
+                await self.scheduler.aacquire(url)
+            session = await self._get_session()
+            async with session.get(url, headers=headers) as resp:
+                if self.scheduler:
+                    await self.scheduler.areport(url, resp.status, time.perf_counter() - start,
+                                                 resp.headers.get("Retry-After"))
+                if cached and resp.status == 304:
+                    await asyncio.to_thread(self.cache.touch, url)
+                    if consumer:
+                        consumer(cached["content"])
+                    return _result(url, cached["status"], cached["headers"], cached["content"],
+                                   start, from_cache=True)
+
+                if consumer is None or resp.status >= 400:
+                    content, truncated = await resp.read(), False
+                else:
+                    content, truncated = await self._read_stream(resp, consumer, max_bytes or STREAM_MAX_BYTES)
+                response_headers = dict(resp.headers)
+
+            if self.cache and resp.status == 200:
+                await asyncio.to_thread(self.cache.put, url, resp.status, response_headers, content)
+            result = _result(url, resp.status, response_headers, content, start)
+            result["truncated"] = truncated
+            return result
+        except _HedgeLost:
+            return None
+        except Exception as e:
+            logger.warning(f"fetch failed for {url}: {str(e) or type(e).__name__}")
+            if self.scheduler and not isinstance(e, TimeoutError):
+                await self.scheduler.areport(url, None, time.perf_counter() - start)
+            return _failed(url, start, str(e) or type(e).__name__, classify_exception(e))
+
+    async def _read_stream(self, resp: aiohttp.ClientResponse, consumer: Callable[[bytes], bool],
+                           max_bytes: int) -> Tuple[bytes, bool]:
+        chunks = []
+        read = 0
+        async for chunk in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+            chunks.append(chunk)
+            read += len(chunk)
+            if consumer(chunk) or read >= max_bytes:
+                # stop early, the unread rest of the body is dropped with the connection
+                return b"".join(chunks), True
+        return b"".join(chunks), False
+
+    async def fetch_all(self, urls: List[str],
+                        consumer_factory: Optional[Callable[[str], Callable[[bytes], bool]]] = None,
+                        max_bytes: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Fetch all urls concurrently on the loop, results are returned in input order."""
+        return await asyncio.gather(*(self.fetch(url, consumer_factory(url) if consumer_factory else None,
+                                                 max_bytes)
+                                      for url in urls))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
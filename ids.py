@@ -0,0 +1,86 @@
+# ids.py
+"""
+Url normalization, marketplace product ids and canonical product urls. Standard
+library only, so export and the caches can use them without loading the agents'
+tools and clients.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+
+ALLOWED_DOMAINS = ["amazon.", "flipkart.", "ebay.", "walmart.", "bestbuy."]
+
+# query params that never change the page content
+TRACKING_PARAMS = {"ref", "ref_", "tag", "psc", "smid", "spla", "sr", "qid", "keywords",
+                   "gclid", "fbclid", "mc_cid", "mc_eid", "otracker", "lid", "marketplace"}
+
+
+def normalize_url(url: str) -> str:
+    """Lowercase scheme/host, drop fragment and tracking params, sort the query string."""
+    parts = urlparse(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")]
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse((parts.scheme.lower() or "https", parts.netloc.lower(), path,
+                       "", urlencode(sorted(query)), ""))
+
+
+# marketplace product ids, used to merge the same listing found under different urls
+_PRODUCT_ID_PATTERNS = [
+    ("amazon", re.compile(r"(?:/dp/|/gp/product/|/product/|^|[^A-Z0-9])(B0[A-Z0-9]{8})(?![A-Z0-9])")),
+    # pid names the variant (colour, storage), itm the listing they share: pid wins wherever it sits
+    ("flipkart", re.compile(r"[?&]pid=([A-Z0-9]+)", re.I)),
+    ("flipkart", re.compile(r"/p/(itm[a-z0-9]+)", re.I)),
+    ("ebay", re.compile(r"/itm/(?:[^/?]+/)?(\d{9,})")),
+    ("walmart", re.compile(r"/ip/(?:[^/?]+/)?(\d+)")),
+    ("bestbuy", re.compile(r"[?&]skuId=(\d+)|/(\d{7})\.p\b")),
+]
+
+# canonical product paths, the id alone is enough to address the page
+_CANONICAL_PATHS = {"amazon": "/dp/{}", "ebay": "/itm/{}", "walmart": "/ip/{}", "bestbuy": "/site/{0}.p?skuId={0}"}
+
+
+def product_id(url: str) -> str:
+    """Marketplace product id like "amazon:B0CHX1W1XY", or the normalized url when none is found."""
+    source = _source(url)
+    for name, pattern in _PRODUCT_ID_PATTERNS:
+        if name != source:
+            continue
+        match = pattern.search(url)
+        if match:
+            return f"{name}:{next(g for g in match.groups() if g)}"
+    return normalize_url(url)
+
+
+def canonical_url(url: str) -> str:
+    """
+    One url per product: normalized (no tracking params or fragment), mobile and
+    share hosts mapped to www, amazon / ebay / walmart / bestbuy reduced to their id
+    (/gp/product/B0.. and /Some-Title/dp/B0..?ref=.. both become /dp/B0..) and
+    flipkart to its product path plus the pid query.
+    """
+    normalized = normalize_url(url)
+    parts = urlparse(normalized)
+    host = re.sub(r"^(?:m|mobile|dl)\.", "www.", parts.netloc)
+    source = _source(host)
+    if source == "unknown":
+        return normalized
+
+    template = _CANONICAL_PATHS.get(source)
+    pid = product_id(normalized)
+    if template and pid.startswith(source + ":"):
+        path, _, query = template.format(pid.split(":", 1)[1]).partition("?")
+        return urlunparse((parts.scheme, host, path, "", query, ""))
+    if source == "flipkart":
+        # dl.flipkart.com share links put /dl in front of the product path
+        path = re.sub(r"^/dl(?=/)", "", parts.path)
+        query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if k == "pid"])
+        return urlunparse((parts.scheme, host, path, "", query, ""))
+    return urlunparse(parts._replace(netloc=host))
+
+
+def _source(url: str) -> str:
+    for d in ALLOWED_DOMAINS:
+        if d in url.lower():
+            return d.strip(".")
+    return "unknown"
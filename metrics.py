@@ -0,0 +1,229 @@
+# metrics.py
+import os
+import json
+import time
+import uuid
+import random
+import inspect
+import functools
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, List, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+METRICS_PREFIX = "scraper"
+METRICS_PORT = os.getenv("metrics_port")
+TRACE_FILE = os.getenv("trace_file")
+TRACE_SAMPLE_RATE = float(os.getenv("trace_sample_rate", "1.0"))
+LOG_SAMPLE_RATE = float(os.getenv("log_sample_rate", "0.1"))
+LOG_LEVEL = os.getenv("log_level", "INFO").upper()
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class SampledFilter(logging.Filter):
+    """Lets every INFO+ record through but only a sample of DEBUG records (hot path chatter)."""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+def get_logger(name: str) -> logging.Logger:
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, SampledFilter) for f in logger.filters):
+        logger.addFilter(SampledFilter())
+        logger.setLevel(LOG_LEVEL)
+    return logger
+
+
+class MetricsRegistry:
+    """Aggregates finished spans into per-span counters, rendered as Prometheus text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations: Dict[str, List[float]] = {}        # span -> [sum, count]
+        self._counters: Dict[Tuple[str, str], float] = {}   # (metric, span) -> total
+        self._errors: Dict[str, int] = {}
+
+    def record(self, span: "Span"):
+        with self._lock:
+            totals = self._durations.setdefault(span.name, [0.0, 0])
+            totals[0] += span.duration
+            totals[1] += 1
+            for key, value in span.counters.items():
+                self._counters[(key, span.name)] = self._counters.get((key, span.name), 0) + value
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [f"# TYPE {METRICS_PREFIX}_span_seconds summary"]
+            for name, (total, count) in sorted(self._durations.items()):
+                lines.append(f'{METRICS_PREFIX}_span_seconds_sum{{span="{name}"}} {total}')
+                lines.append(f'{METRICS_PREFIX}_span_seconds_count{{span="{name}"}} {count}')
+
+            lines.append(f"# TYPE {METRICS_PREFIX}_span_errors_total counter")
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'{METRICS_PREFIX}_span_errors_total{{span="{name}"}} {count}')
+
+            for metric in sorted({metric for metric, _ in self._counters}):
+                lines.append(f"# TYPE {METRICS_PREFIX}_{metric}_total counter")
+                for (m, name), value in sorted(self._counters.items()):
+                    if m == metric:
+                        lines.append(f'{METRICS_PREFIX}_{metric}_total{{span="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class OTLPFileExporter:
+    """Appends sampled spans as OTLP/JSON lines (one resourceSpans object per line)."""
+
+    def __init__(self, path: str, sample_rate: float = TRACE_SAMPLE_RATE, service_name: str = "product-scraper"):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def export(self, span: "Span"):
+        if random.random() >= self.sample_rate:
+            return
+        attributes = [{"key": k, "value": {"stringValue": str(v)}} for k, v in span.attributes.items()]
+        attributes += [{"key": k, "value": {"doubleValue": v}} for k, v in span.counters.items()]
+        line = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "scraper"}, "spans": [{
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "startTimeUnixNano": int(span.start * 1e9),
+                "endTimeUnixNano": int((span.start + span.duration) * 1e9),
+                "attributes": attributes,
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }]}],
+        }]}
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line) + "\n")
+
+
+class Span:
+    """
+    One timed unit of work. Numeric measurements (tokens_in, tokens_out,
+    http_bytes, cache_hits, retries, ...) go through add() and are summed into
+    the registry; free-form context goes through set().
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = 0.0
+        self.attributes: Dict[str, Any] = {}
+        self.counters: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, value: float = 1):
+        self.counters[key] = self.counters.get(key, 0) + value
+
+
+registry = MetricsRegistry()
+exporters: List[OTLPFileExporter] = [OTLPFileExporter(TRACE_FILE)] if TRACE_FILE else []
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a block as a span nested under the current one, then record and export it."""
+    parent = _current_span.get()
+    current = Span(name, parent)
+    for key, value in attributes.items():
+        current.set(key, value)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = str(e)
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        registry.record(current)
+        for exporter in exporters:
+            exporter.export(current)
+
+
+def record(key: str, value: float = 1):
+    """Add a measurement to the active span, a no-op outside of any span."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(key, value)
+
+
+def traced(name: str):
+    """Decorator form of span() for graph nodes, sync or async."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Adds LLM token usage to the active span (tokens_in / tokens_out / llm_calls)."""
+
+    def on_llm_end(self, response, **kwargs):
+        record("llm_calls")
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                record("tokens_in", usage.get("input_tokens", 0))
+                record("tokens_out", usage.get("output_tokens", 0))
+
+
+token_callback = TokenUsageCallback()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve registry.render() at http://host:port/metrics for Prometheus to scrape."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,86 @@
+# parsepool.py
+import os
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import Dict, Any, Optional, Tuple
+
+from extract import parse_html
+
+
+# 0 parses on the calling thread
+PARSE_WORKERS = int(os.getenv("parse_workers", "0"))
+# bodies at least this large go through shared memory instead of being pickled down the pipe
+SHM_THRESHOLD = int(os.getenv("parse_shm_threshold", str(64 * 1024)))
+
+_WARMUP_PAGE = b'<html><head><title>warmup</title><script type="application/ld+json">' \
+               b'{"@type": "Product", "name": "warmup", "offers": {"price": "1"}}</script></head></html>'
+
+
+def _warm_worker():
+    # import the parser and run it once so the first real page does not pay for it
+    parse_html(_WARMUP_PAGE, "https://warmup.invalid/")
+
+
+def _parse_shared(name: str, size: int, url: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    # workers share the parent's resource tracker, so attaching does not take ownership;
+    # the parent unlinks the segment once the future is done
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return parse_html(bytes(shm.buf[:size]), url)
+    finally:
+        shm.close()
+
+
+def _ready(_: int) -> bool:
+    return True
+
+
+class ParsePool:
+    """
+    Process pool for full HTML parses, so parsing scales with cores and never holds
+    the GIL of the process doing the fetching and running the agents.
+    - workers are spawned (not forked, the parent runs fetch threads) and warm up
+      the parser in their initializer; warm() starts all of them up front
+    - spawn re-runs the parent's main script in every worker (as __mp_main__); the
+      entry points go through cli.py, which imports nothing there, so workers load
+      parsepool and extract only
+    - large bodies are handed over in a shared memory segment, the pipe only
+      carries its name; small ones are pickled as usual
+    - submit() returns a future of (fields, description), see extract.parse_html
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS, shm_threshold: int = SHM_THRESHOLD):
+        self.workers = workers
+        self.shm_threshold = shm_threshold
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                             initializer=_warm_worker)
+
+    def warm(self):
+        """Start every worker now instead of on the first pages."""
+        list(self._executor.map(_ready, range(self.workers)))
+
+    def submit(self, content: bytes, url: str) -> Future:
+        if len(content) < self.shm_threshold:
+            return self._executor.submit(parse_html, content, url)
+
+        shm = shared_memory.SharedMemory(create=True, size=len(content))
+        shm.buf[:len(content)] = content
+        try:
+            future = self._executor.submit(_parse_shared, shm.name, len(content), url)
+        except Exception:
+            self._release(shm)
+            raise
+        future.add_done_callback(lambda _: self._release(shm))
+        return future
+
+    @staticmethod
+    def _release(shm: shared_memory.SharedMemory):
+        try:
+            shm.close()
+            shm.unlink()
+        except (FileNotFoundError, BufferError):
+            logging.debug(f"shared memory segment {shm.name} already released")
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,224 @@
+# ratelimit.py
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, List
+from urllib.parse import urlparse
+
+
+DEFAULT_RATE = 2.0          # requests per second per domain
+DEFAULT_BURST = 4
+MIN_RATE = 0.1
+BACKOFF_FACTOR = 0.5        # rate multiplier on 429 / 503
+RECOVERY_STEP = 0.1         # rate added back per successful request
+DEFAULT_BLOCK_SECONDS = 30.0
+THROTTLE_STATUSES = (429, 503)
+
+SCHEDULER_STATE_PATH = os.getenv("scheduler_state_path")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delay seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _BucketState:
+    __slots__ = ("rate", "max_rate", "burst", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.max_rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.blocked_until = 0.0
+
+
+def _take(state: _BucketState, now: float) -> float:
+    """Refill and try to take one token. Returns 0 on success, else seconds to wait."""
+    if now < state.blocked_until:
+        return state.blocked_until - now
+    state.tokens = min(state.burst, state.tokens + (now - state.updated) * state.rate)
+    state.updated = now
+    if state.tokens >= 1:
+        state.tokens -= 1
+        return 0.0
+    return (1 - state.tokens) / state.rate
+
+
+def _adapt(state: _BucketState, status: Optional[int], retry_after: Optional[float], now: float):
+    if status in THROTTLE_STATUSES:
+        state.rate = max(MIN_RATE, state.rate * BACKOFF_FACTOR)
+        state.tokens = 0.0
+        state.blocked_until = max(state.blocked_until, now + (retry_after or DEFAULT_BLOCK_SECONDS))
+    elif status is not None and status < 400:
+        state.rate = min(state.max_rate, state.rate + RECOVERY_STEP)
+
+
+class DomainScheduler:
+    """
+    Politeness scheduler shared by every fetch, keyed by marketplace domain.
+    - token bucket per domain (rates = {"amazon.": 1.0, ...}, requests/second)
+    - honors Retry-After and backs off multiplicatively on 429 / 503,
+      then recovers additively on success
+    - per-domain request / error / throttle / latency stats
+    With state_path the buckets live in a SQLite file so several processes
+    of one batch run share the same limits.
+    """
+
+    def __init__(self,
+                 domains: List[str],
+                 rates: Optional[Dict[str, float]] = None,
+                 default_rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST,
+                 state_path: Optional[str] = SCHEDULER_STATE_PATH):
+        self.domains = domains
+        self.rates = rates or {}
+        self.default_rate = default_rate
+        self.burst = burst
+        self.state_path = state_path
+
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _BucketState] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._local = threading.local()
+        if state_path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS buckets (domain TEXT PRIMARY KEY, rate REAL, max_rate REAL, "
+                "burst INTEGER, tokens REAL, updated REAL, blocked_until REAL)")
+
+    def domain_key(self, url: str) -> str:
+        host = urlparse(url).netloc.lower()
+        for domain in self.domains:
+            if domain in host:
+                return domain
+        return host
+
+    # --- bucket storage -----------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.state_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _new_bucket(self, key: str) -> _BucketState:
+        return _BucketState(self.rates.get(key, self.default_rate), self.burst)
+
+    def _update(self, key: str, fn) -> Any:
+        """Run fn(state) atomically against the bucket of key, in-process or across processes."""
+        if not self.state_path:
+            with self._lock:
+                state = self._buckets.get(key)
+                if state is None:
+                    state = self._buckets[key] = self._new_bucket(key)
+                return fn(state)
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT rate, max_rate, burst, tokens, updated, blocked_until "
+                               "FROM buckets WHERE domain = ?", (key,)).fetchone()
+            state = self._new_bucket(key)
+            if row is not None:
+                (state.rate, state.max_rate, state.burst, state.tokens,
+                 state.updated, state.blocked_until) = row
+            result = fn(state)
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, state.rate, state.max_rate, state.burst, state.tokens,
+                          state.updated, state.blocked_until))
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def _aupdate(self, key: str, fn) -> Any:
+        """_update() for the event loop: the SQLite transaction can wait on other processes, so it runs in a thread."""
+        if not self.state_path:
+            return self._update(key, fn)
+        return await asyncio.to_thread(self._update, key, fn)
+
+    # --- public api ---------------------------------------------------------
+
+    def acquire(self, url: str, timeout: Optional[float] = None) -> float:
+        """Block until the domain of url may be hit. Returns seconds waited."""
+        key = self.domain_key(url)
+        start = time.time()
+        while True:
+            wait = self._update(key, lambda state: _take(state, time.time()))
+            if wait <= 0:
+                return time.time() - start
+            if timeout is not None and time.time() - start + wait > timeout:
+                raise TimeoutError(f"rate limit wait for {key} exceeds {timeout}s")
+            time.sleep(min(wait, 1.0))
+
+    async def aacquire(self, url: str, timeout: Optional[float] = None) -> float:
+        """acquire() for the event loop: waits with asyncio.sleep instead of blocking the thread."""
+        key = self.domain_key(url)
+        start = time.time()
+        while True:
+            wait = await self._aupdate(key, lambda state: _take(state, time.time()))
+            if wait <= 0:
+                return time.time() - start
+            if timeout is not None and time.time() - start + wait > timeout:
+                raise TimeoutError(f"rate limit wait for {key} exceeds {timeout}s")
+            await asyncio.sleep(min(wait, 1.0))
+
+    def report(self, url: str, status: Optional[int], latency: float,
+               retry_after: Optional[str] = None):
+        """Feed back the outcome of a request so the domain rate can adapt."""
+        key = self.domain_key(url)
+        delay = parse_retry_after(retry_after)
+        self._update(key, lambda state: _adapt(state, status, delay, time.time()))
+        self._count(key, status, latency)
+
+    async def areport(self, url: str, status: Optional[int], latency: float,
+                      retry_after: Optional[str] = None):
+        """report() for the event loop."""
+        key = self.domain_key(url)
+        delay = parse_retry_after(retry_after)
+        await self._aupdate(key, lambda state: _adapt(state, status, delay, time.time()))
+        self._count(key, status, latency)
+
+    def _count(self, key: str, status: Optional[int], latency: float):
+        with self._lock:
+            stats = self._stats.setdefault(key, {"requests": 0, "errors": 0, "throttled": 0,
+                                                 "latency_total": 0.0})
+            stats["requests"] += 1
+            stats["latency_total"] += latency
+            if status in THROTTLE_STATUSES:
+                stats["throttled"] += 1
+            elif status is None or status >= 400:
+                stats["errors"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        with self._lock:
+            items = [(key, dict(stats)) for key, stats in self._stats.items()]
+        for key, stats in items:
+            rate = self._update(key, lambda state: state.rate)
+            out[key] = {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "throttled": stats["throttled"],
+                "avg_latency": stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0,
+                "rate": rate,
+            }
+        return out
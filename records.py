@@ -0,0 +1,76 @@
+# records.py
+import os
+import operator
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional
+
+
+MESSAGE_WINDOW = int(os.getenv("message_window", "8"))
+if MESSAGE_WINDOW < 1:
+    raise ValueError(f"message_window must be at least 1, got {MESSAGE_WINDOW}")
+SUMMARY_CHARS = int(os.getenv("summary_chars", "1000"))
+
+
+@dataclass(slots=True)
+class LinkRecord:
+    """One candidate product link, as returned by getProductLinks."""
+    url: str
+    source: str = "unknown"
+    title: Optional[str] = None
+    snippet: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "LinkRecord":
+        return cls(url=d.get("url") or d.get("link") or "", source=d.get("source") or "unknown",
+                   title=d.get("title"), snippet=d.get("snippet"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """One extracted product page, as returned by getProductDetails."""
+    url: Optional[str]
+    source: Optional[str] = None
+    asin: Optional[str] = None
+    title: Optional[str] = None
+    price: Optional[Dict[str, Any]] = None
+    availability: Optional[str] = None
+    images: List[str] = field(default_factory=list)
+    specs: Dict[str, Any] = field(default_factory=dict)
+    rating: Optional[float] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ProductRecord":
+        return cls(url=d.get("url"), source=d.get("source"), asin=d.get("asin"), title=d.get("title"),
+                   price=d.get("price"), availability=d.get("availability"), images=d.get("images") or [],
+                   specs=d.get("specs") or {}, rating=d.get("rating"), error=d.get("error"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def window_messages(left: List[Any], right: List[Any]) -> List[Any]:
+    """
+    Append-only reducer for AgentState.messages.
+    Nodes return only their new messages; the history keeps the first message
+    (the user query) plus the newest MESSAGE_WINDOW - 1, so per-hop copy and
+    checkpoint cost stay constant however long the run is.
+    """
+    merged = (left or []) + (right or [])
+    if len(merged) <= MESSAGE_WINDOW:
+        return merged
+    # an explicit start index: with a window of 1, merged[-0:] would keep everything
+    return merged[:1] + merged[len(merged) - (MESSAGE_WINDOW - 1):]
+
+
+# errors only ever grow by a few entries per run
+append_errors = operator.add
+
+
+def summarize(text: Optional[str], limit: int = SUMMARY_CHARS) -> str:
+    """Keep agent free text short, it only serves as a human readable summary."""
+    text = text or ""
+    return text if len(text) <= limit else text[:limit] + "..."
@@ -0,0 +1,188 @@
+# refresh.py
+"""
+Incremental price / availability refresh for tracked products.
+
+Skips search, the supervisor and full extraction: every known product page is
+re-fetched with a conditional request (ETag / Last-Modified from the response
+cache), a 304 costs no body download, and only the volatile fields are read,
+from the streaming scanner where possible. They are compared with the tracked
+record, which may be older than the cached page, whether the page changed or
+not. Changes are written as an NDJSON change feed:
+
+    python cli.py refresh tracked.ndjson -o changes.ndjson
+    python cli.py refresh --from-index -o changes.ndjson
+
+Input lines are product records (anything with a 'url') or batch.py output lines,
+whose details_results.products are expanded.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import Iterable, Iterator, Dict, Any, Tuple
+
+import tool
+from extract import StreamingScanner
+from metrics import METRICS_PORT, start_metrics_server, span, record, get_logger
+
+
+logger = get_logger(__name__)
+
+VOLATILE_FIELDS = ["price", "availability", "rating"]
+REFRESH_MAX_PENDING = int(os.getenv("refresh_max_pending", "256"))
+
+
+def volatile_fields(url: str, content: bytes, scanner: StreamingScanner) -> Dict[str, Any]:
+    """
+    Price, availability and rating; the page is only parsed in full when streaming
+    missed one of them (a page that never shows a rating is parsed in full every time).
+    """
+    fields = scanner.fields()
+    if any(fields[name] is None for name in VOLATILE_FIELDS):
+        fields, _ = tool.parse_page(url, content).result()
+    return {name: fields.get(name) for name in VOLATILE_FIELDS}
+
+
+def diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Changed volatile fields as {field: {"old": ..., "new": ...}}. A field the page
+    no longer yields (None) is not a change, blocked or broken pages would
+    otherwise wipe every product.
+    """
+    return {name: {"old": old.get(name), "new": new[name]}
+            for name in VOLATILE_FIELDS
+            if new[name] is not None and new[name] != old.get(name)}
+
+
+def _check(product_id: str, url: str, old: Dict[str, Any], page: Dict[str, Any],
+           scanner: StreamingScanner, submitted_at: float) -> Dict[str, Any]:
+    event = {"type": "unchanged", "product_id": product_id, "url": url, "checked_at": time.time()}
+    with span("refresh_product"):
+        record("refresh_checked")
+        if page["error"]:
+            record("fetch_errors")
+            event.update(type="error", error=page["error"])
+            return event
+
+        if page["from_cache"]:
+            # 304 Not Modified: the cached page (already fed to the scanner) is current
+            record("refresh_not_modified")
+        else:
+            record("http_bytes", len(page["content"]))
+        try:
+            new = volatile_fields(url, page["content"], scanner)
+        except Exception as e:
+            logger.warning(f"refresh parse failed for {url}: {e}")
+            record("parse_errors")
+            event.update(type="error", error=f"parse failed: {e}")
+            return event
+
+        changes = diff(old, new)
+        if changes:
+            record("refresh_changed")
+            event.update(type="changed", changes=changes)
+
+        index = tool.product_index()
+        if index is not None:
+            # an entry extracted while this page was in flight is newer and stays as it is
+            index.update(product_id, url, {name: value for name, value in new.items() if value is not None},
+                         base=old, observed_at=submitted_at)
+    return event
+
+
+_Pending = Dict[Future, Tuple[str, str, Dict[str, Any], StreamingScanner, float]]
+
+
+def _finish(pending: _Pending) -> Iterator[Dict[str, Any]]:
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        product_id, url, old, scanner, submitted_at = pending.pop(future)
+        yield _check(product_id, url, old, future.result(), scanner, submitted_at)
+
+
+def refresh_products(products: Iterable[Dict[str, Any]],
+                     max_pending: int = REFRESH_MAX_PENDING) -> Iterator[Dict[str, Any]]:
+    """
+    Re-check every product record and yield one event per product as its page comes back:
+    {"type": "changed" | "unchanged" | "error", "product_id", "url", "checked_at", "changes"?, "error"?}
+    At most max_pending fetches are in flight, so products can be a lazy iterator
+    over any number of records. The product index is updated with the new values.
+    """
+    pending: _Pending = {}
+    fetcher = tool.page_fetcher()
+    for product in products:
+        url = product.get("url")
+        if not url:
+            continue
+
+        if len(pending) >= max_pending:
+            yield from _finish(pending)
+
+        # stop reading the page once the volatile fields are known
+        scanner = StreamingScanner(required=tuple(VOLATILE_FIELDS))
+        submitted_at = time.time()
+        future = fetcher.submit(url, scanner.feed_bytes, revalidate=True)
+        pending[future] = (tool.product_id(url), url, product, scanner, submitted_at)
+
+    while pending:
+        yield from _finish(pending)
+
+
+def _tracked(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if "details_results" in item:
+            yield from (item["details_results"] or {}).get("products", [])
+        else:
+            yield item
+
+
+def _from_index() -> Iterator[Dict[str, Any]]:
+    for _, url, product in tool.product_index().iter_records():
+        yield dict(product, url=url)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh price / availability of tracked products.")
+    parser.add_argument("products", nargs="?", default="-",
+                        help="NDJSON product records or batch output, '-' for stdin")
+    parser.add_argument("--from-index", action="store_true", help="refresh every product in the product index")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON change feed path, '-' for stdout")
+    parser.add_argument("--all", action="store_true", help="also write unchanged products to the feed")
+    parser.add_argument("--max-pending", type=int, default=REFRESH_MAX_PENDING)
+    args = parser.parse_args(argv)
+
+    if args.from_index and tool.product_index() is None:
+        parser.error("--from-index needs the product index (product_index=1)")
+
+    source = None
+    if args.from_index:
+        products = _from_index()
+    else:
+        source = sys.stdin if args.products == "-" else open(args.products, encoding="utf-8")
+        products = _tracked(source)
+    sink = sys.stdout if args.output == "-" else open(args.output, "a", encoding="utf-8")
+
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    tool.warm_parse_pool()
+
+    counts: Dict[str, int] = {}
+    try:
+        for event in refresh_products(products, max_pending=args.max_pending):
+            counts[event["type"]] = counts.get(event["type"], 0) + 1
+            if event["type"] != "unchanged" or args.all:
+                sink.write(json.dumps(event, default=str) + "\n")
+                sink.flush()
+    finally:
+        if source is not None and source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    logger.info(f"refresh finished: {counts}")
@@ -0,0 +1,288 @@
+# resilience.py
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Callable, Awaitable, TypeVar
+
+import aiohttp
+import requests
+
+from metrics import record, get_logger
+
+
+logger = get_logger(__name__)
+T = TypeVar("T")
+
+RETRY_ATTEMPTS = int(os.getenv("retry_attempts", "3"))
+RETRY_BASE_DELAY = float(os.getenv("retry_base_delay", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("retry_max_delay", "8"))
+BREAKER_FAILURES = int(os.getenv("breaker_failures", "5"))
+BREAKER_COOLDOWN = float(os.getenv("breaker_cooldown", "30"))
+# a search still running after this many seconds gets a duplicate, the first answer wins; 0 disables
+SEARCH_HEDGE_AFTER = float(os.getenv("search_hedge_after", "2.0"))
+# a page fetch with no body yet after this many seconds gets a duplicate request; 0 disables
+FETCH_HEDGE_AFTER = float(os.getenv("fetch_hedge_after", "3.0"))
+
+# error classes
+TRANSIENT = "transient"          # timeouts, resets, 5xx: worth another attempt
+THROTTLED = "throttled"          # 429 / 503: the rate limiter backs off, not retried in place
+BLOCKED = "blocked"              # 401 / 403: bot wall, retrying will not help
+PERMANENT = "permanent"          # 4xx and errors that are bugs, not outages
+CIRCUIT_OPEN = "circuit_open"    # not attempted, the domain failed too often recently
+
+RETRYABLE = {TRANSIENT}
+# outcomes that say the upstream is unhealthy, as opposed to one bad url
+BREAKER_FAILURE_CLASSES = {TRANSIENT, THROTTLED, BLOCKED}
+# the same call again cannot succeed soon, the router should not loop on these
+TERMINAL = {BLOCKED, PERMANENT, CIRCUIT_OPEN}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+def classify_status(status: Optional[int]) -> Optional[str]:
+    """Error class of an HTTP status, None for success (2xx / 3xx)."""
+    if status is None:
+        return TRANSIENT
+    if status < 400:
+        return None
+    if status in (429, 503):
+        return THROTTLED
+    if status in (401, 403):
+        return BLOCKED
+    if status >= 500:
+        return TRANSIENT
+    return PERMANENT
+
+
+_PERMANENT_ERRORS = (
+    requests.exceptions.InvalidURL,
+    requests.exceptions.MissingSchema,
+    requests.exceptions.InvalidSchema,
+    requests.exceptions.InvalidHeader,
+    requests.exceptions.TooManyRedirects,
+    aiohttp.InvalidURL,
+)
+
+
+def classify_exception(e: BaseException) -> str:
+    if isinstance(e, CircuitOpenError):
+        return CIRCUIT_OPEN
+    # requests.HTTPError carries .response, aiohttp.ClientResponseError .status
+    status = getattr(e, "status", None) or getattr(getattr(e, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return classify_status(status)
+    # bad urls and redirect loops subclass OSError too, but no retry will fix them
+    if isinstance(e, _PERMANENT_ERRORS):
+        return PERMANENT
+    # requests' connection and timeout errors are OSError subclasses
+    if isinstance(e, (TimeoutError, asyncio.TimeoutError, OSError,
+                      aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)):
+        return TRANSIENT
+    return PERMANENT
+
+
+class RetryPolicy:
+    """Bounded retries with full-jitter exponential backoff, only for RETRYABLE errors."""
+
+    def __init__(self, attempts: int = RETRY_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, error_class: Optional[str], attempt: int) -> bool:
+        """attempt counts from 0 for the first try."""
+        return error_class in RETRYABLE and attempt + 1 < self.attempts
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class _Circuit:
+    __slots__ = ("failures", "opened_at", "probing")
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+
+class CircuitBreaker:
+    """
+    Per-key (marketplace domain, "serper") circuit breakers.
+    - failures consecutive upstream failures (BREAKER_FAILURE_CLASSES) open the circuit
+    - while open, allow() is False and callers fail fast with CIRCUIT_OPEN
+    - after cooldown seconds one probe call is let through (half-open); its
+      outcome closes the circuit or opens it for another cooldown
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._circuits: Dict[str, _Circuit] = {}
+        self._rejected: Dict[str, int] = {}
+
+    def allow(self, key: str) -> bool:
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.opened_at is None:
+                return True
+            if not circuit.probing and time.monotonic() - circuit.opened_at >= self.cooldown:
+                circuit.probing = True
+                return True
+            self._rejected[key] = self._rejected.get(key, 0) + 1
+            return False
+
+    def report(self, key: str, error_class: Optional[str]):
+        """Feed back the outcome of a call that allow() let through."""
+        with self._lock:
+            circuit = self._circuits.setdefault(key, _Circuit())
+            if error_class in BREAKER_FAILURE_CLASSES:
+                circuit.failures += 1
+                if circuit.probing or circuit.failures >= self.failures:
+                    if circuit.opened_at is None or circuit.probing:
+                        logger.warning(f"circuit for {key} open for {self.cooldown:.0f}s "
+                                       f"after {circuit.failures} failures")
+                    circuit.opened_at = time.monotonic()
+            elif error_class != CIRCUIT_OPEN:
+                # success, or an error that says nothing about the upstream's health
+                circuit.failures = 0
+                circuit.opened_at = None
+            circuit.probing = False
+
+    def release(self, key: str):
+        """Give back a call allow() let through that ended without an outcome (cancelled)."""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is not None:
+                circuit.probing = False
+
+    def state(self, key: str) -> str:
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.opened_at is None:
+                return "closed"
+            return "half_open" if circuit.probing else "open"
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            keys = list(self._circuits)
+            failures = {key: self._circuits[key].failures for key in keys}
+            rejected = dict(self._rejected)
+        return {key: {"state": self.state(key), "failures": failures[key], "rejected": rejected.get(key, 0)}
+                for key in keys}
+
+
+class ResilientCall:
+    """
+    Wraps calls to one upstream (the search API) with its circuit breaker,
+    retries and hedging: when a call is still running after hedge_after seconds a
+    duplicate is started and whichever finishes first is returned. Only use it
+    for idempotent calls.
+    """
+
+    def __init__(self, key: str, breaker: CircuitBreaker, retry: Optional[RetryPolicy] = None,
+                 hedge_after: float = 0.0, max_workers: int = 8):
+        self.key = key
+        self.breaker = breaker
+        self.retry = retry or RetryPolicy()
+        self.hedge_after = hedge_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{key}") \
+            if hedge_after > 0 else None
+
+    def _check(self):
+        if not self.breaker.allow(self.key):
+            raise CircuitOpenError(f"circuit for {self.key} is open")
+
+    def call(self, fn: Callable[[], T]) -> T:
+        for attempt in range(self.retry.attempts):
+            self._check()
+            try:
+                result = self._hedged(fn)
+            except Exception as e:
+                error_class = classify_exception(e)
+                self.breaker.report(self.key, error_class)
+                if not self.retry.should_retry(error_class, attempt):
+                    raise
+                record("retries")
+                logger.info(f"{self.key} call failed ({error_class}: {e}), retrying")
+                time.sleep(self.retry.delay(attempt))
+                continue
+            except BaseException:
+                # interrupted, which says nothing about the upstream: free a half-open probe
+                self.breaker.release(self.key)
+                raise
+            self.breaker.report(self.key, None)
+            return result
+
+    def _hedged(self, fn: Callable[[], T]) -> T:
+        if self._executor is None:
+            return fn()
+        # both copies record their metrics on the caller's span
+        first = self._executor.submit(contextvars.copy_context().run, fn)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        record("hedged_requests")
+        futures = {first, self._executor.submit(contextvars.copy_context().run, fn)}
+        error: Optional[BaseException] = None
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(self.retry.attempts):
+            self._check()
+            try:
+                result = await self._ahedged(fn)
+            except Exception as e:
+                error_class = classify_exception(e)
+                self.breaker.report(self.key, error_class)
+                if not self.retry.should_retry(error_class, attempt):
+                    raise
+                record("retries")
+                logger.info(f"{self.key} call failed ({error_class}: {e}), retrying")
+                await asyncio.sleep(self.retry.delay(attempt))
+                continue
+            except BaseException:
+                # cancelled, which says nothing about the upstream: free a half-open probe
+                self.breaker.release(self.key)
+                raise
+            self.breaker.report(self.key, None)
+            return result
+
+    async def _ahedged(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if self.hedge_after <= 0:
+            return await fn()
+        pending = {asyncio.ensure_future(fn())}
+        error: Optional[BaseException] = None
+        try:
+            # a caller cancelled while waiting cancels every copy still running
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_after)
+            if done:
+                return done.pop().result()
+
+            record("hedged_requests")
+            pending.add(asyncio.ensure_future(fn()))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
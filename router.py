@@ -0,0 +1,183 @@
+# router.py
+import json
+import threading
+from typing import Dict, Any, Optional, List, Callable
+
+from langchain_core.messages import HumanMessage
+from prompts import SupervisorNodePrompt
+from resilience import TERMINAL
+from metrics import token_callback, get_logger
+
+
+logger = get_logger(__name__)
+
+ROUTES = ["link_chain_node", "detail_extract_node", "FINISH"]
+
+
+def fallback_route(state: Dict[str, Any]) -> str:
+    """The supervisor's deterministic decision, based only on which results exist."""
+    if not state.get("link_results"):
+        return "link_chain_node"
+    if not state.get("details_results"):
+        return "detail_extract_node"
+    return "FINISH"
+
+
+class RoutingPolicy:
+    """Base routing policy. route() returns the next node name, or None if it cannot decide."""
+
+    name = "base"
+
+    def route(self, state: Dict[str, Any]) -> Optional[str]:
+        raise NotImplementedError
+
+    async def aroute(self, state: Dict[str, Any]) -> Optional[str]:
+        """Async route(); policies that do no I/O just decide inline."""
+        return self.route(state)
+
+
+class RuleRouter(RoutingPolicy):
+    """
+    Rule based router for the unambiguous states, no model call.
+    A search that failed for good (blocked, permanent, circuit open, see
+    resilience.TERMINAL) finishes the run, searching again cannot help.
+    Returns None (defer) for other errors, since the right move (retry,
+    skip ahead, finish) then needs judgement.
+    """
+
+    name = "rule"
+
+    def route(self, state: Dict[str, Any]) -> Optional[str]:
+        link_results = state.get("link_results") or {}
+        details_results = state.get("details_results") or {}
+
+        if link_results.get("error_class") in TERMINAL:
+            return "FINISH"
+        if state.get("errors") or link_results.get("error") or details_results.get("error"):
+            return None
+        return fallback_route(state)
+
+
+class LLMRouter(RoutingPolicy):
+    """
+    Asks the supervisor model for the next node. The chat model is created once and reused;
+    model_factory lets it share a client that is already built elsewhere.
+    """
+
+    name = "llm"
+
+    def __init__(self, model_name: str, google_api_key: str, cache=None,
+                 model_factory: Optional[Callable[[], Any]] = None):
+        self.model_name = model_name
+        self.google_api_key = google_api_key
+        self.cache = cache
+        self.model_factory = model_factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None and self.model_factory is not None:
+                self._model = self.model_factory()
+            elif self._model is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                self._model = ChatGoogleGenerativeAI(
+                    model=self.model_name,
+                    google_api_key=self.google_api_key,
+                    cache=self.cache
+                )
+            return self._model
+
+    def build_prompt(self, state: Dict[str, Any]) -> str:
+        messages = state.get("messages", [])
+        errors = state.get("errors", [])
+
+        context = f"""
+        User Query: {state.get("user_query", "")}
+        Link Results Available: {'Yes' if state.get("link_results") else 'No'}
+        Details Results Available: {'Yes' if state.get("details_results") else 'No'}
+        Errors: {json.dumps(errors[-3:])}
+
+        Recent Messages:
+        {json.dumps([msg.content if hasattr(msg, 'content') else str(msg) for msg in messages[-3:]], indent=2)}
+        """
+
+        return f"""
+        {SupervisorNodePrompt}
+
+        Current Context: {context}
+
+        Based on the current state, decide the next action:
+        - If no links have been extracted yet, choose 'link_chain_node'
+        - If links are available but no details extracted, choose 'detail_extract_node'
+        - If both links and details are available, choose 'FINISH'
+
+        Respond with just the node name: link_chain_node, detail_extract_node, or FINISH
+        """
+
+    def route(self, state: Dict[str, Any]) -> Optional[str]:
+        response = self._get_model().invoke([HumanMessage(content=self.build_prompt(state))],
+                                            config={"callbacks": [token_callback]})
+        next_node = response.content.strip()
+        return next_node if next_node in ROUTES else None
+
+    async def aroute(self, state: Dict[str, Any]) -> Optional[str]:
+        response = await self._get_model().ainvoke([HumanMessage(content=self.build_prompt(state))],
+                                                   config={"callbacks": [token_callback]})
+        next_node = response.content.strip()
+        return next_node if next_node in ROUTES else None
+
+
+class HybridRouter(RoutingPolicy):
+    """
+    Tries each policy in order and takes the first decision.
+    Falls back to fallback_route() if every policy defers.
+    stats() reports which policy decided and how many model hops were saved.
+    """
+
+    name = "hybrid"
+
+    def __init__(self, policies: List[RoutingPolicy]):
+        self.policies = policies
+        self._lock = threading.Lock()
+        self._decisions: Dict[str, int] = {p.name: 0 for p in policies}
+        self._decisions["fallback"] = 0
+
+    def route(self, state: Dict[str, Any]) -> str:
+        for policy in self.policies:
+            next_node = policy.route(state)
+            if next_node is not None:
+                self._record(policy.name)
+                return next_node
+
+        logger.info("all routing policies deferred, using fallback route")
+        self._record("fallback")
+        return fallback_route(state)
+
+    async def aroute(self, state: Dict[str, Any]) -> str:
+        for policy in self.policies:
+            next_node = await policy.aroute(state)
+            if next_node is not None:
+                self._record(policy.name)
+                return next_node
+
+        logger.info("all routing policies deferred, using fallback route")
+        self._record("fallback")
+        return fallback_route(state)
+
+    def _record(self, name: str):
+        with self._lock:
+            self._decisions[name] = self._decisions.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            decisions = dict(self._decisions)
+        llm_calls = decisions.get(LLMRouter.name, 0)
+        total = sum(decisions.values())
+        return {
+            "decisions": decisions,
+            "total_hops": total,
+            "llm_calls": llm_calls,
+            # every hop not answered by the model is a supervisor call we did not pay for
+            "llm_hops_saved": decisions.get(RuleRouter.name, 0),
+        }
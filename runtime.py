@@ -0,0 +1,89 @@
+# runtime.py
+import time
+import threading
+from typing import Dict, Any, Callable, Optional, Hashable, List
+
+from metrics import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class Runtime:
+    """
+    Process-wide holder of the objects that are expensive to build: model clients,
+    agent executors, compiled graphs, HTTP sessions and pools.
+    - register() only records a factory, nothing is built or imported until get()
+    - get() builds the object on first use and hands out the same one afterwards
+    - warm() builds objects up front, for services that should not pay on the first query
+    - set() swaps an object in (fake models in benchmarks)
+    - close() runs the closers of everything that was built, newest first
+    """
+
+    def __init__(self):
+        self._factories: Dict[Hashable, Callable[[], Any]] = {}
+        self._closers: Dict[Hashable, Callable[[Any], None]] = {}
+        self._objects: Dict[Hashable, Any] = {}
+        self._build_seconds: Dict[Hashable, float] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: Hashable, factory: Callable[[], Any],
+                 close: Optional[Callable[[Any], None]] = None):
+        with self._lock:
+            self._factories[name] = factory
+            if close is not None:
+                self._closers[name] = close
+
+    def get(self, name: Hashable, factory: Optional[Callable[[], Any]] = None) -> Any:
+        """The object registered under name, built now if needed; factory registers it on the way."""
+        obj = self._objects.get(name)
+        if obj is not None:
+            return obj
+
+        with self._lock:
+            obj = self._objects.get(name)
+            if obj is None:
+                if factory is not None and name not in self._factories:
+                    self._factories[name] = factory
+                start = time.perf_counter()
+                obj = self._factories[name]()
+                self._build_seconds[name] = time.perf_counter() - start
+                logger.debug(f"runtime built {name} in {self._build_seconds[name]:.3f}s")
+                self._objects[name] = obj
+            return obj
+
+    def set(self, name: Hashable, obj: Any):
+        with self._lock:
+            self._objects[name] = obj
+
+    def warm(self, names: Optional[List[Hashable]] = None):
+        """Build the named objects (every registered one by default) now."""
+        with self._lock:
+            names = list(self._factories) if names is None else names
+        for name in names:
+            self.get(name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "registered": len(self._factories),
+                "built": [str(name) for name in self._objects],
+                "build_seconds": {str(name): seconds for name, seconds in self._build_seconds.items()},
+            }
+
+    def close(self):
+        with self._lock:
+            built = list(self._objects.items())
+            self._objects.clear()
+        for name, obj in reversed(built):
+            closer = self._closers.get(name)
+            if closer is None:
+                continue
+            try:
+                closer(obj)
+            except Exception as e:
+                logger.warning(f"closing {name} failed: {e}")
+
+
+# shared by the workflow, the tools and the entry points
+runtime = Runtime()
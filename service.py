@@ -0,0 +1,366 @@
+# service.py
+"""
+Long-running local scraping service over HTTP/JSON.
+
+Keeps the compiled graph, model clients, caches and parse pool warm and runs
+queries from a bounded priority queue on a pool of worker threads:
+
+    python cli.py service --port 8080
+
+    POST /query   {"query": "...", "priority": 5}  -> the run result as JSON
+    GET  /stream?q=...&priority=5                  -> server-sent events: one 'product'
+                                                      event per extracted page, then 'result'
+    GET  /metrics                                   -> Prometheus text, spans plus queue metrics
+    GET  /healthz
+
+Lower priority values run first. Identical queries (after canonical_query) that are
+already queued or running share one run. A full queue answers 503 with Retry-After.
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import argparse
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import tool
+from batch import _serializable
+from metrics import METRICS_PREFIX, registry, span, get_logger
+from runtime import runtime
+from test_agent import get_workflow, stream_scraping_agent
+
+
+logger = get_logger(__name__)
+
+SERVICE_PORT = int(os.getenv("service_port", "8080"))
+SERVICE_WORKERS = int(os.getenv("service_workers", "4"))
+SERVICE_QUEUE_SIZE = int(os.getenv("service_queue_size", "256"))
+# seconds a request waits for its run before answering 504, the run itself goes on
+SERVICE_TIMEOUT = float(os.getenv("service_timeout", "300"))
+# the pipeline graph streams products as they are parsed, the supervised graph only its result
+SERVICE_PIPELINE = os.getenv("service_pipeline", "1") == "1"
+DEFAULT_PRIORITY = 5
+# SSE comment sent while a stream has nothing new, so dead clients are noticed
+KEEPALIVE_SECONDS = 15.0
+
+
+class QueryJob:
+    """One queued or running query; every request for it reads the same event log."""
+
+    def __init__(self, query: str, key: str, priority: int):
+        self.query = query
+        self.key = key
+        self.priority = priority
+        # checkpoints of the run, deleted when it finishes: nothing resumes a service run
+        self.thread_id = f"service-{uuid.uuid4().hex}"
+        self.submitted = time.perf_counter()
+        self.started: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self._events: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def publish(self, event: Dict[str, Any]):
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def finish(self, result: Dict[str, Any]):
+        with self._cond:
+            self.result = result
+            self._cond.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout)
+            return self.result
+
+    def events(self, keepalive: float = KEEPALIVE_SECONDS) -> Iterator[Optional[Dict[str, Any]]]:
+        """Every event from the start, then new ones as they come; None is a keepalive tick."""
+        seen = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._events) > seen or self.done, keepalive)
+                new = self._events[seen:]
+                finished = self.done and seen + len(new) == len(self._events)
+            seen += len(new)
+            if not new and not finished:
+                yield None
+            yield from new
+            if finished:
+                return
+
+
+class ScrapingService:
+    """
+    Bounded priority queue in front of a worker pool running stream_scraping_agent.
+    - submit() joins a queued or running job for the same canonical query instead
+      of starting a second one, and raises queue.Full when the queue is at capacity
+    - workers share one compiled graph; each job gets its own checkpoint thread
+    - stats() feeds /metrics: queue depth, running jobs, wait and run latency
+    """
+
+    def __init__(self, workers: int = SERVICE_WORKERS, queue_size: int = SERVICE_QUEUE_SIZE,
+                 pipeline: bool = SERVICE_PIPELINE):
+        self.workers = workers
+        self.pipeline = pipeline
+        self._queue: "queue.PriorityQueue[Tuple[float, int, Optional[QueryJob]]]" = \
+            queue.PriorityQueue(maxsize=queue_size)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, QueryJob] = {}
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._counts = {"submitted": 0, "deduplicated": 0, "rejected": 0, "completed": 0, "failed": 0}
+        self._wait_seconds = [0.0, 0]
+        self._run_seconds = [0.0, 0]
+
+    def start(self):
+        """Build the graph and parse pool up front, then start the workers."""
+        get_workflow(pipeline=self.pipeline)
+        tool.warm_parse_pool()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"service-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Finish what is queued, then stop the workers."""
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._seq), None))
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def submit(self, query: str, priority: int = DEFAULT_PRIORITY) -> Tuple[QueryJob, bool]:
+        """The job running query and whether it was already in flight."""
+        key = tool.canonical_query(query)
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                self._counts["deduplicated"] += 1
+                return job, True
+
+            job = QueryJob(query, key, priority)
+            try:
+                self._queue.put_nowait((priority, next(self._seq), job))
+            except queue.Full:
+                self._counts["rejected"] += 1
+                raise
+            self._inflight[key] = job
+            self._counts["submitted"] += 1
+            return job, False
+
+    def _work(self):
+        app = get_workflow(pipeline=self.pipeline)
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self._running += 1
+            job.started = time.perf_counter()
+            result = {"success": False, "error": "no result"}
+            try:
+                with span("service_query", priority=job.priority):
+                    for event in stream_scraping_agent(job.query, app=app, thread_id=job.thread_id):
+                        if "result" in event:
+                            result = event["result"]
+                        else:
+                            job.publish(event)
+            except Exception as e:
+                logger.warning(f"service run failed for {job.query!r}: {e}")
+                result = {"success": False, "error": str(e)}
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._inflight.pop(job.key, None)
+                    self._running -= 1
+                    self._counts["completed" if result.get("success") else "failed"] += 1
+                    self._wait_seconds[0] += job.started - job.submitted
+                    self._wait_seconds[1] += 1
+                    self._run_seconds[0] += finished - job.started
+                    self._run_seconds[1] += 1
+                job.finish(result)
+                self._forget(app, job.thread_id)
+
+    @staticmethod
+    def _forget(app, thread_id: str):
+        checkpointer = getattr(app, "checkpointer", None)
+        if checkpointer is None:
+            return
+        try:
+            checkpointer.delete_thread(thread_id)
+        except Exception as e:
+            logger.warning(f"could not delete checkpoints of {thread_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "running": self._running,
+                "workers": len(self._threads),
+                **self._counts,
+                "queue_wait_seconds": list(self._wait_seconds),
+                "run_seconds": list(self._run_seconds),
+            }
+
+    def render_metrics(self) -> str:
+        stats = self.stats()
+        lines = []
+        for name in ("queue_depth", "running", "workers"):
+            lines.append(f"# TYPE {METRICS_PREFIX}_service_{name} gauge")
+            lines.append(f"{METRICS_PREFIX}_service_{name} {stats[name]}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_service_queries_total counter")
+        for outcome in ("submitted", "deduplicated", "rejected", "completed", "failed"):
+            lines.append(f'{METRICS_PREFIX}_service_queries_total{{outcome="{outcome}"}} {stats[outcome]}')
+        for name in ("queue_wait_seconds", "run_seconds"):
+            total, count = stats[name]
+            lines.append(f"# TYPE {METRICS_PREFIX}_service_{name} summary")
+            lines.append(f"{METRICS_PREFIX}_service_{name}_sum {total}")
+            lines.append(f"{METRICS_PREFIX}_service_{name}_count {count}")
+        return registry.render() + "\n".join(lines) + "\n"
+
+
+def _result_body(result: Dict[str, Any]) -> Dict[str, Any]:
+    return _serializable(result) if result.get("success") else result
+
+
+def make_handler(service: ScrapingService, timeout: float = SERVICE_TIMEOUT):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _submit(self, query: Any, priority: Any) -> Optional[QueryJob]:
+            if not isinstance(query, str) or not query.strip():
+                self._send_json(400, {"error": "missing query"})
+                return None
+            try:
+                priority = int(priority)
+            except (TypeError, ValueError):
+                self._send_json(400, {"error": "priority must be an integer"})
+                return None
+            try:
+                job, _ = service.submit(query.strip(), priority)
+            except queue.Full:
+                self._send_json(503, {"error": "queue full"}, {"Retry-After": "5"})
+                return None
+            return job
+
+        def do_POST(self):
+            if urlparse(self.path).path.rstrip("/") != "/query":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except (ValueError, json.JSONDecodeError):
+                self._send_json(400, {"error": "body must be JSON"})
+                return
+            if not isinstance(body, dict):
+                self._send_json(400, {"error": "body must be a JSON object"})
+                return
+
+            job = self._submit(body.get("query"), body.get("priority", DEFAULT_PRIORITY))
+            if job is None:
+                return
+            result = job.wait(timeout)
+            if result is None:
+                self._send_json(504, {"error": f"no result within {timeout:.0f}s, the query is still running"})
+                return
+            self._send_json(200, _result_body(result))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            path = url.path.rstrip("/")
+            if path == "/metrics":
+                data = service.render_metrics().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            elif path == "/healthz":
+                self._send_json(200, {"ok": True, **service.stats(), "runtime": runtime.stats()})
+            elif path == "/stream":
+                params = parse_qs(url.query)
+                job = self._submit(params.get("q", [None])[0], params.get("priority", [DEFAULT_PRIORITY])[0])
+                if job is not None:
+                    self._stream(job)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _stream(self, job: QueryJob):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for event in job.events():
+                    if event is None:
+                        self.wfile.write(b": keepalive\n\n")
+                    else:
+                        self.wfile.write(f"event: product\ndata: {json.dumps(event, default=str)}\n\n".encode())
+                    self.wfile.flush()
+                result = json.dumps(_result_body(job.result), default=str)
+                self.wfile.write(f"event: result\ndata: {result}\n\n".encode())
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # the client went away, the run goes on for anyone else waiting on it
+                logger.debug(f"stream client for {job.query!r} disconnected")
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = "127.0.0.1", port: int = SERVICE_PORT,
+          service: Optional[ScrapingService] = None) -> Tuple[ThreadingHTTPServer, ScrapingService]:
+    """Start the service and its HTTP server in background threads."""
+    service = service or ScrapingService()
+    service.start()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the scraping agent as a local HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE)
+    args = parser.parse_args(argv)
+
+    server, service = serve(args.host, args.port, ScrapingService(args.workers, args.queue_size))
+    logger.info(f"scraping service listening on http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        service.stop()
+        runtime.close()
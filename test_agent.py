@@ -2,199 +2,372 @@
 import os
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from prompts import LinkNodePrompt, DetailNodePrompt, SupervisorNodePrompt
+from prompts import LinkNodePrompt, DetailNodePrompt, SummaryPrompt
 from typing_extensions import TypedDict, Annotated
-from typing import Literal, List, Dict, Any
+from typing import Literal, List, Dict, Any, Optional, Iterator, AsyncIterator
 from langgraph.types import Command
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langgraph.config import get_stream_writer
 from langchain_core.prompts import PromptTemplate
-from langchain.agents import create_react_agent, AgentExecutor
-from tool import getProductDetails, getProductLinks
-import json
+from langchain_core.runnables import RunnablePassthrough
+from langchain_core.tools import render_text_description
+from tool import getProductDetails, getProductLinks, stream_products
+from router import HybridRouter, RuleRouter, LLMRouter
+from checkpoint import SqliteCheckpointer, make_serde
+from metrics import traced, token_callback, get_logger
+from budget import ContextBudget
+from cache import LLMResponseCache, LLM_CACHE_ENABLED
+from records import LinkRecord, ProductRecord, window_messages, append_errors, summarize
+from runtime import runtime
+import uuid
 
 load_dotenv()
 google_api_key = os.getenv("google_api_key", "")
+logger = get_logger(__name__)
+context_budget = ContextBudget()
+# shared by every agent and the supervisor; None lets the models skip caching
+llm_cache = LLMResponseCache() if LLM_CACHE_ENABLED else None
+
+# "direct" calls the node's tool with arguments taken from state, "agent" runs the ReAct loop
+NODE_MODE = os.getenv("node_mode", "direct")
+# in direct mode the node summaries are templated unless an LLM summary is asked for
+LLM_SUMMARIES = os.getenv("llm_summaries", "0") == "1"
+SUMMARY_MODEL = os.getenv("summary_model", "gemini-1.5-flash")
+# search and detail extraction run as one streaming node instead of two supervised stages
+PIPELINE_MODE = os.getenv("pipeline_mode", "0") == "1"
 
 
 class AgentState(TypedDict):
-    messages: List[Any]
+    messages: Annotated[List[Any], window_messages]
     user_query: str
     link_results: Dict[str, Any]
     details_results: Dict[str, Any]
-    selected_links: List[Dict[str, Any]]
+    selected_links: List[LinkRecord]
     final_output: Dict[str, Any]
-    errors: List[str]
+    errors: Annotated[List[str], append_errors]
     next: str
 
 
-def create_agent(llm_name: str, tools: list, prompt: str):
-    llm_model = ChatGoogleGenerativeAI(
-        model=llm_name,
-        google_api_key=google_api_key
-    )
+def chat_model(llm_name: str):
+    """One chat client per model name, shared by every agent and node that uses it."""
+    def build():
+        # the google client stack is slow to import, only pay for it once a model is needed
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model=llm_name, google_api_key=google_api_key, cache=llm_cache)
+
+    return runtime.get(("chat_model", llm_name), build)
+
 
-    agent = create_react_agent(
-        llm=llm_model,
-        tools=tools,
-        prompt=prompt
+def create_agent(llm_name: str, tools: list, prompt: str, llm_model=None):
+    from langchain.agents import AgentExecutor
+    from langchain.agents.output_parsers import ReActSingleInputOutputParser
+
+    llm_model = llm_model or chat_model(llm_name)
+
+    # same pipeline as langchain's create_react_agent, except that tool observations
+    # go through the context budget before they are written into the scratchpad
+    prompt_template = PromptTemplate.from_template(prompt).partial(
+        tools=render_text_description(tools),
+        tool_names=", ".join(t.name for t in tools)
+    )
+    agent = (
+        RunnablePassthrough.assign(agent_scratchpad=lambda x: context_budget.format_scratchpad(x["intermediate_steps"]))
+        | prompt_template
+        | llm_model.bind(stop=["\nObservation"])
+        | ReActSingleInputOutputParser()
     )
 
-    return AgentExecutor(agent=agent, tools=tools, verbose=True)
+    # intermediate steps carry the raw tool output, so nodes can keep typed records
+    # instead of re-parsing the agent's final text
+    return AgentExecutor(agent=agent, tools=tools, verbose=True, return_intermediate_steps=True)
 
 
-# Create agents
-link_chain_agent = create_agent(
+# Agents are built on first use: direct mode and the pipeline never need them
+runtime.register("link_chain_agent", lambda: create_agent(
     llm_name="gemini-1.5-flash",
     tools=[getProductLinks],
     prompt=LinkNodePrompt
-)
+))
 
-detail_extract_agent = create_agent(
+runtime.register("detail_extract_agent", lambda: create_agent(
     llm_name="gemini-1.5-flash",
     tools=[getProductDetails],
     prompt=DetailNodePrompt
-)
+))
+
+
+def _tool_outputs(result: Dict[str, Any], tool_name: str) -> List[Dict[str, Any]]:
+    """Structured observations of every call to tool_name in an AgentExecutor result."""
+    outputs = []
+    for action, observation in result.get("intermediate_steps", []):
+        if getattr(action, "tool", None) == tool_name and isinstance(observation, dict):
+            outputs.append(observation)
+    return outputs
+
+
+def _link_records(observations: List[Dict[str, Any]]) -> List[LinkRecord]:
+    links = {}
+    for observation in observations:
+        for item in observation.get("results", []):
+            record = LinkRecord.from_dict(item)
+            if record.url:
+                links.setdefault(record.url, record)
+    return list(links.values())
+
+
+def _summary_prompt(task: str, data: Any) -> str:
+    return f"{SummaryPrompt}\n\nTask: {task}\nResults: {context_budget.compress(data)}"
+
+
+def summarize_results(task: str, data: Any) -> Optional[str]:
+    """Optional one paragraph LLM summary of a direct tool result, None when llm_summaries is off."""
+    if not LLM_SUMMARIES:
+        return None
+    response = chat_model(SUMMARY_MODEL).invoke([HumanMessage(content=_summary_prompt(task, data))],
+                                     config={"callbacks": [token_callback]})
+    return response.content
+
+
+async def asummarize_results(task: str, data: Any) -> Optional[str]:
+    if not LLM_SUMMARIES:
+        return None
+    response = await chat_model(SUMMARY_MODEL).ainvoke([HumanMessage(content=_summary_prompt(task, data))],
+                                            config={"callbacks": [token_callback]})
+    return response.content
+
+
+def _user_query(state: AgentState) -> str:
+    user_query = state.get("user_query", "")
+    if not user_query:
+        # Extract query from messages if not in state
+        for msg in state.get("messages", []):
+            if isinstance(msg, HumanMessage):
+                return msg.content
+    return user_query
+
+
+LINK_TASK = "Search for product links for: {}"
+DETAIL_TASK = "Extract detailed product information from these links: {}"
+
+
+def _link_update(user_query: str, links: List[LinkRecord], output: str,
+                 error: Optional[str] = None, error_class: Optional[str] = None) -> Dict[str, Any]:
+    link_results = {"query": user_query, "count": len(links), "summary": summarize(output)}
+    if error:
+        link_results["error"] = error
+        link_results["error_class"] = error_class
+    return {
+        "link_results": link_results,
+        "selected_links": links,
+        "messages": [AIMessage(content=summarize(output), name="link_chain_node")]
+    }
+
+
+def _direct_links(user_query: str, observation: Dict[str, Any], summary: Optional[str]) -> Dict[str, Any]:
+    links = _link_records([observation])
+    output = summary or f"Found {len(links)} product links for: {user_query}"
+    # search errors surface in link_results so the router can judge them
+    return _link_update(user_query, links, output, observation.get("error"), observation.get("error_class"))
+
 
+def _agent_links(user_query: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    links = _link_records(_tool_outputs(result, getProductLinks.name))
+    return _link_update(user_query, links, result.get("output", ""))
 
+
+def _detail_links(state: AgentState) -> Any:
+    # typed links go straight to the tool; the summary is parsed for urls as a fallback
+    links = [link.to_dict() for link in state.get("selected_links", [])]
+    return links or state.get("link_results", {}).get("summary", "")
+
+
+def _detail_input(state: AgentState) -> str:
+    selected_links = state.get("selected_links", [])
+    if selected_links:
+        # the detail step only needs where to go, not the search snippets
+        return context_budget.compress([link.to_dict() for link in selected_links],
+                                       fields=["url", "source", "title"])
+    # no structured links, fall back to the link agent's summary
+    return state.get("link_results", {}).get("summary", "")
+
+
+def _detail_update(products: List[ProductRecord], output: str) -> Dict[str, Any]:
+    return {
+        "details_results": {"products": products, "summary": summarize(output)},
+        "messages": [AIMessage(content=summarize(output), name="detail_extract_node")]
+    }
+
+
+def _direct_details(observation: Dict[str, Any], summary: Optional[str]) -> Dict[str, Any]:
+    products = [ProductRecord.from_dict(item) for item in observation.get("results", [])]
+    found = sum(1 for p in products if not p.error)
+    return _detail_update(products, summary or f"Extracted {found} of {len(products)} product pages")
+
+
+def _agent_details(result: Dict[str, Any]) -> Dict[str, Any]:
+    products = [ProductRecord.from_dict(item)
+                for observation in _tool_outputs(result, getProductDetails.name)
+                for item in observation.get("results", [])]
+    return _detail_update(products, result.get("output", ""))
+
+
+def _node_error(node: str, e: Exception) -> Dict[str, Any]:
+    error_msg = f"Error in {node}: {str(e)}"
+    return {
+        "errors": [error_msg],
+        "messages": [AIMessage(content=error_msg, name=node)]
+    }
+
+
+@traced("link_chain_node")
 def link_chain_node(state: AgentState) -> Dict[str, Any]:
     """Extract product links based on user query"""
     try:
-        user_query = state.get("user_query", "")
-        if not user_query:
-            # Extract query from messages if not in state
-            for msg in state.get("messages", []):
-                if isinstance(msg, HumanMessage):
-                    user_query = msg.content
-                    break
+        user_query = _user_query(state)
+
+        if NODE_MODE == "direct":
+            # the arguments are known, call the tool without a ReAct round-trip
+            observation = getProductLinks.invoke({"productName": user_query})
+            return _direct_links(user_query, observation,
+                                 summarize_results(LINK_TASK.format(user_query), observation))
+
+        result = runtime.get("link_chain_agent").invoke({
+            "input": LINK_TASK.format(user_query)
+        }, config={"callbacks": [token_callback]})
+        return _agent_links(user_query, result)
+    except Exception as e:
+        return _node_error("link_chain_node", e)
 
-        result = link_chain_agent.invoke({
-            "input": f"Search for product links for: {user_query}"
-        })
 
-        # Parse the result to extract structured data
-        output = result.get("output", "")
+@traced("link_chain_node")
+async def alink_chain_node(state: AgentState) -> Dict[str, Any]:
+    """Async link_chain_node"""
+    try:
+        user_query = _user_query(state)
 
-        return {
-            "link_results": {"raw_output": output, "query": user_query},
-            "messages": state["messages"] + [
-                AIMessage(content=output, name="link_chain_node")
-            ]
-        }
+        if NODE_MODE == "direct":
+            observation = await getProductLinks.ainvoke({"productName": user_query})
+            return _direct_links(user_query, observation,
+                                 await asummarize_results(LINK_TASK.format(user_query), observation))
+
+        result = await runtime.get("link_chain_agent").ainvoke({
+            "input": LINK_TASK.format(user_query)
+        }, config={"callbacks": [token_callback]})
+        return _agent_links(user_query, result)
     except Exception as e:
-        error_msg = f"Error in link_chain_node: {str(e)}"
-        return {
-            "errors": state.get("errors", []) + [error_msg],
-            "messages": state["messages"] + [
-                AIMessage(content=error_msg, name="link_chain_node")
-            ]
-        }
+        return _node_error("link_chain_node", e)
 
 
+@traced("detail_extract_node")
 def detail_extract_node(state: AgentState) -> Dict[str, Any]:
     """Extract detailed product information from links"""
     try:
-        link_results = state.get("link_results", {})
-        selected_links = state.get("selected_links", [])
-
-        # If no selected links, try to extract from link_results
-        if not selected_links and link_results:
-            # This would need to be parsed from the link_results
-            # For now, we'll pass the link_results to the agent
-            input_data = json.dumps(link_results)
-        else:
-            input_data = json.dumps(selected_links)
+        if NODE_MODE == "direct":
+            observation = getProductDetails.invoke({"links": _detail_links(state)})
+            return _direct_details(observation,
+                                   summarize_results(DETAIL_TASK.format("selected links"), observation))
+
+        result = runtime.get("detail_extract_agent").invoke({
+            "input": DETAIL_TASK.format(_detail_input(state))
+        }, config={"callbacks": [token_callback]})
+        return _agent_details(result)
+    except Exception as e:
+        return _node_error("detail_extract_node", e)
 
-        result = detail_extract_agent.invoke({
-            "input": f"Extract detailed product information from these links: {input_data}"
-        })
 
-        output = result.get("output", "")
+@traced("detail_extract_node")
+async def adetail_extract_node(state: AgentState) -> Dict[str, Any]:
+    """Async detail_extract_node"""
+    try:
+        if NODE_MODE == "direct":
+            observation = await getProductDetails.ainvoke({"links": _detail_links(state)})
+            return _direct_details(observation,
+                                   await asummarize_results(DETAIL_TASK.format("selected links"), observation))
+
+        result = await runtime.get("detail_extract_agent").ainvoke({
+            "input": DETAIL_TASK.format(_detail_input(state))
+        }, config={"callbacks": [token_callback]})
+        return _agent_details(result)
+    except Exception as e:
+        return _node_error("detail_extract_node", e)
+
 
+@traced("pipeline_node")
+def pipeline_node(state: AgentState) -> Dict[str, Any]:
+    """Search and extract in one step, streaming every product record as soon as its page is parsed"""
+    try:
+        user_query = _user_query(state)
+        # no-op unless the graph is streamed with stream_mode "custom"
+        writer = get_stream_writer()
+
+        links, products = [], []
+        for kind, item in stream_products(user_query):
+            if kind == "link":
+                links.append(LinkRecord.from_dict(item))
+                continue
+            products.append(ProductRecord.from_dict(item))
+            writer({"product": item, "done": len(products), "total": len(links)})
+
+        found = sum(1 for p in products if not p.error)
+        output = f"Found {len(links)} product links, extracted {found} of {len(products)} product pages"
         return {
-            "details_results": {"raw_output": output},
-            "messages": state["messages"] + [
-                AIMessage(content=output, name="detail_extract_node")
-            ]
+            "link_results": {"query": user_query, "count": len(links), "summary": output},
+            "selected_links": links,
+            "details_results": {"products": products, "summary": output},
+            "messages": [AIMessage(content=output, name="pipeline_node")]
         }
     except Exception as e:
-        error_msg = f"Error in detail_extract_node: {str(e)}"
-        return {
-            "errors": state.get("errors", []) + [error_msg],
-            "messages": state["messages"] + [
-                AIMessage(content=error_msg, name="detail_extract_node")
-            ]
-        }
+        return _node_error("pipeline_node", e)
+
 
+SUPERVISOR_MODEL = os.getenv("supervisor_model", "gemini-1.5-flash")
 
+# Rules decide the unambiguous states, the model is only asked when errors make it a judgement call
+router = HybridRouter([
+    RuleRouter(),
+    LLMRouter(model_name=SUPERVISOR_MODEL, google_api_key=google_api_key, cache=llm_cache,
+              model_factory=lambda: chat_model(SUPERVISOR_MODEL)),
+])
+
+
+@traced("supervisor_node")
 def supervisor_node(state: AgentState) -> Dict[str, Any]:
     """Supervisor decides which node to execute next"""
     try:
-        supervisor_model = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=google_api_key
-        )
-
-        # Get the current state and decide next action
-        messages = state.get("messages", [])
-        user_query = state.get("user_query", "")
-        link_results = state.get("link_results", {})
-        details_results = state.get("details_results", {})
-
-        # Build context for supervisor
-        context = f"""
-        User Query: {user_query}
-        Link Results Available: {'Yes' if link_results else 'No'}
-        Details Results Available: {'Yes' if details_results else 'No'}
-        
-        Recent Messages:
-        {json.dumps([msg.content if hasattr(msg, 'content') else str(msg) for msg in messages[-3:]], indent=2)}
-        """
-
-        supervisor_prompt = f"""
-        {SupervisorNodePrompt}
-        
-        Current Context: {context}
-        
-        Based on the current state, decide the next action:
-        - If no links have been extracted yet, choose 'link_chain_node'
-        - If links are available but no details extracted, choose 'detail_extract_node'  
-        - If both links and details are available, choose 'FINISH'
-        
-        Respond with just the node name: link_chain_node, detail_extract_node, or FINISH
-        """
-
-        response = supervisor_model.invoke([HumanMessage(content=supervisor_prompt)])
-        next_node = response.content.strip()
-
-        # Validate the response
-        if next_node not in ["link_chain_node", "detail_extract_node", "FINISH"]:
-            # Default logic based on state
-            if not link_results:
-                next_node = "link_chain_node"
-            elif not details_results:
-                next_node = "detail_extract_node"
-            else:
-                next_node = "FINISH"
+        next_node = router.route(state)
 
         return {
             "next": next_node,
-            "messages": state["messages"] + [
-                AIMessage(content=f"Supervisor decision: {next_node}", name="supervisor")
-            ]
+            "messages": [AIMessage(content=f"Supervisor decision: {next_node}", name="supervisor")]
         }
 
     except Exception as e:
-        error_msg = f"Error in supervisor_node: {str(e)}"
+        return _supervisor_error(e)
+
+
+@traced("supervisor_node")
+async def asupervisor_node(state: AgentState) -> Dict[str, Any]:
+    """Async supervisor_node"""
+    try:
+        next_node = await router.aroute(state)
+
         return {
-            "next": "FINISH",
-            "errors": state.get("errors", []) + [error_msg],
-            "messages": state["messages"] + [
-                AIMessage(content=error_msg, name="supervisor")
-            ]
+            "next": next_node,
+            "messages": [AIMessage(content=f"Supervisor decision: {next_node}", name="supervisor")]
         }
 
+    except Exception as e:
+        return _supervisor_error(e)
+
+
+def _supervisor_error(e: Exception) -> Dict[str, Any]:
+    error_msg = f"Error in supervisor_node: {str(e)}"
+    return {
+        "next": "FINISH",
+        "errors": [error_msg],
+        "messages": [AIMessage(content=error_msg, name="supervisor")]
+    }
+
 
 def should_continue(state: AgentState) -> str:
     """Determine if workflow should continue or end"""
@@ -204,14 +377,24 @@ def should_continue(state: AgentState) -> str:
     return next_action
 
 
-def create_workflow():
-    """Create the LangGraph workflow"""
+def create_workflow(checkpointer=None, pipeline: bool = PIPELINE_MODE, use_async: bool = False):
+    """
+    Create the LangGraph workflow.
+    With pipeline=True the supervisor's link step goes to pipeline_node, which also
+    fills details_results, so the detail stage is never needed.
+    With use_async=True the nodes are the async variants, run it with ainvoke/astream
+    (pipeline_node stays sync and is run in a thread by LangGraph).
+    """
     workflow = StateGraph(AgentState)
+    link_node = "pipeline_node" if pipeline else "link_chain_node"
 
     # Add nodes
-    workflow.add_node("supervisor", supervisor_node)
-    workflow.add_node("link_chain_node", link_chain_node)
-    workflow.add_node("detail_extract_node", detail_extract_node)
+    workflow.add_node("supervisor", asupervisor_node if use_async else supervisor_node)
+    if pipeline:
+        workflow.add_node("pipeline_node", pipeline_node)
+    else:
+        workflow.add_node("link_chain_node", alink_chain_node if use_async else link_chain_node)
+    workflow.add_node("detail_extract_node", adetail_extract_node if use_async else detail_extract_node)
 
     # Add edges
     workflow.add_edge(START, "supervisor")
@@ -219,26 +402,29 @@ def create_workflow():
         "supervisor",
         should_continue,
         {
-            "link_chain_node": "link_chain_node",
+            "link_chain_node": link_node,
             "detail_extract_node": "detail_extract_node",
             END: END
         }
     )
-    workflow.add_edge("link_chain_node", "supervisor")
+    workflow.add_edge(link_node, "supervisor")
     workflow.add_edge("detail_extract_node", "supervisor")
 
-    # Compile with checkpointer
-    checkpointer = MemorySaver()
+    # Compile with a durable checkpointer so interrupted runs can resume
+    checkpointer = checkpointer or SqliteCheckpointer(serde=make_serde([LinkRecord, ProductRecord]))
     app = workflow.compile(checkpointer=checkpointer)
 
     return app
 
 
-def run_scraping_agent(user_query: str) -> Dict[str, Any]:
-    """Run the complete scraping workflow"""
-    app = create_workflow()
+def get_workflow(pipeline: bool = PIPELINE_MODE, use_async: bool = False):
+    """Compiled workflow shared by every run in this process, built on first use."""
+    return runtime.get(("workflow", pipeline, use_async),
+                       lambda: create_workflow(pipeline=pipeline, use_async=use_async))
+
 
-    initial_state = {
+def _initial_state(user_query: str) -> Dict[str, Any]:
+    return {
         "messages": [HumanMessage(content=user_query)],
         "user_query": user_query,
         "link_results": {},
@@ -249,24 +435,49 @@ def run_scraping_agent(user_query: str) -> Dict[str, Any]:
         "next": ""
     }
 
-    config = {"configurable": {"thread_id": "scraping_session"}}
+
+def _thread_config(thread_id: Optional[str]) -> Dict[str, Any]:
+    # every run gets its own checkpoint thread so concurrent runs never share state
+    return {"configurable": {"thread_id": thread_id or f"scraping-{uuid.uuid4().hex}"}}
+
+
+def _run_result(last_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "link_results": last_state.get("link_results", {}),
+        "details_results": last_state.get("details_results", {}),
+        "messages": last_state.get("messages", []),
+        "errors": last_state.get("errors", []),
+        "node_mode": NODE_MODE,
+        "routing": router.stats(),
+        "context_budget": context_budget.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else None
+    }
+
+
+def run_scraping_agent(user_query: str, app=None, thread_id: Optional[str] = None) -> Dict[str, Any]:
+    """Run the complete scraping workflow"""
+    app = app or get_workflow()
+    config = _thread_config(thread_id)
 
     try:
-        final_state = None
-        for state in app.stream(initial_state, config=config):
-            print(f"Current state keys: {list(state.keys())}")
-            final_state = state
+        # a thread that already has checkpoints is resumed (or returned as is if it
+        # finished) instead of paying for its search and LLM calls again; tasks, not
+        # next: checkpoints are saved in the background, so a crash can leave the last
+        # step's tasks done (as pending writes) with no checkpoint after them
+        snapshot = app.get_state(config)
+        if snapshot.values and not snapshot.tasks:
+            final_state = snapshot.values
+        else:
+            final_state = None
+            stream_input = None if snapshot.tasks else _initial_state(user_query)
+            for state in app.stream(stream_input, config=config):
+                logger.debug(f"Current state keys: {list(state.keys())}")
+                final_state = state
 
         # Extract final results
         if final_state:
-            last_state = list(final_state.values())[-1]
-            return {
-                "success": True,
-                "link_results": last_state.get("link_results", {}),
-                "details_results": last_state.get("details_results", {}),
-                "messages": last_state.get("messages", []),
-                "errors": last_state.get("errors", [])
-            }
+            return _run_result(app.get_state(config).values)
         else:
             return {"success": False, "error": "No final state received"}
 
@@ -274,6 +485,75 @@ def run_scraping_agent(user_query: str) -> Dict[str, Any]:
         return {"success": False, "error": str(e)}
 
 
+def stream_scraping_agent(user_query: str, app=None, thread_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run the workflow in pipeline mode and yield each product as soon as it is extracted:
+    {"product": {...}, "done": n, "total": links}. The last item is {"result": ...}
+    with the same shape as run_scraping_agent's return value.
+    """
+    app = app or get_workflow(pipeline=True)
+    config = _thread_config(thread_id)
+
+    try:
+        for mode, chunk in app.stream(_initial_state(user_query), config=config,
+                                      stream_mode=["custom", "updates"]):
+            if mode == "custom":
+                yield chunk
+            else:
+                logger.debug(f"Current state keys: {list(chunk.keys())}")
+        yield {"result": _run_result(app.get_state(config).values)}
+
+    except Exception as e:
+        yield {"result": {"success": False, "error": str(e)}}
+
+
+async def arun_scraping_agent(user_query: str, app=None, thread_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    run_scraping_agent on the event loop: many queries can share one loop and its
+    HTTP connection pool, e.g. asyncio.gather(*(arun_scraping_agent(q) for q in queries)).
+    """
+    app = app or get_workflow(use_async=True)
+    config = _thread_config(thread_id)
+
+    try:
+        snapshot = await app.aget_state(config)
+        if snapshot.values and not snapshot.tasks:
+            final_state = snapshot.values
+        else:
+            final_state = None
+            stream_input = None if snapshot.tasks else _initial_state(user_query)
+            async for state in app.astream(stream_input, config=config):
+                logger.debug(f"Current state keys: {list(state.keys())}")
+                final_state = state
+
+        if final_state:
+            return _run_result((await app.aget_state(config)).values)
+        else:
+            return {"success": False, "error": "No final state received"}
+
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+async def astream_scraping_agent(user_query: str, app=None,
+                                 thread_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Async stream_scraping_agent, same events."""
+    app = app or get_workflow(pipeline=True, use_async=True)
+    config = _thread_config(thread_id)
+
+    try:
+        async for mode, chunk in app.astream(_initial_state(user_query), config=config,
+                                             stream_mode=["custom", "updates"]):
+            if mode == "custom":
+                yield chunk
+            else:
+                logger.debug(f"Current state keys: {list(chunk.keys())}")
+        yield {"result": _run_result((await app.aget_state(config)).values)}
+
+    except Exception as e:
+        yield {"result": {"success": False, "error": str(e)}}
+
+
 if __name__ == "__main__":
     # Test the workflow
     query = "iPhone 15 Pro Max 256GB"
@@ -285,6 +565,7 @@ if __name__ == "__main__":
         print("\n=== SCRAPING RESULTS ===")
         print(f"Link Results: {result['link_results']}")
         print(f"Details Results: {result['details_results']}")
+        print(f"Routing: {result['routing']}")
         if result["errors"]:
             print(f"Errors: {result['errors']}")
     else:
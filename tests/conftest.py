@@ -0,0 +1,35 @@
+# conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ.setdefault("google_api_key", "offline-tests")
+
+
+@pytest.fixture(scope="session")
+def fixture_server():
+    from bench import FixtureServer
+
+    with FixtureServer() as server:
+        yield server
+
+
+@pytest.fixture
+def fixture_search(fixture_server, monkeypatch):
+    """Recorded serper responses pointing at the fixture server, with every cache and rate limit off."""
+    import tool
+    from bench import FixtureSearch
+    from cache import TTLCache
+
+    search = FixtureSearch(fixture_server)
+    monkeypatch.setattr(tool, "_search_client", search)
+    monkeypatch.setattr(tool, "_search_cache", TTLCache(path=None))
+    monkeypatch.setattr(tool, "_index", None)
+    for fetcher in (tool._fetcher, tool._afetcher):
+        monkeypatch.setattr(fetcher, "cache", None)
+        monkeypatch.setattr(fetcher, "scheduler", None)
+    return search
@@ -0,0 +1,89 @@
+# test_checkpoint.py
+import os
+import sys
+import sqlite3
+import subprocess
+
+from conftest import ROOT
+
+
+QUERY = "iphone 15 pro max 256gb"
+
+# runs the graph until the detail step, then dies without any cleanup (no atexit, no close)
+CRASH_SCRIPT = """
+import os, sys, time
+import bench, tool, test_agent
+from cache import TTLCache
+from checkpoint import SqliteCheckpointer, make_serde
+from records import LinkRecord, ProductRecord
+
+server = bench.FixtureServer()
+server.base_url = os.environ["fixture_base_url"]
+tool._search_client = bench.FixtureSearch(server)
+tool._search_cache = TTLCache(path=None)
+tool._index = None
+saver = SqliteCheckpointer(sys.argv[1], serde=make_serde([LinkRecord, ProductRecord]))
+
+def crash(state):
+    # LangGraph hands checkpoints to a background thread; the link step is finished
+    # once its checkpoint is committed, whatever is still in flight is lost with the process
+    config = {"configurable": {"thread_id": "crash"}}
+    while not any(c.checkpoint["channel_values"].get("link_results") for c in saver.list(config)):
+        time.sleep(0.01)
+    os._exit(3)
+
+test_agent.detail_extract_node = crash
+app = test_agent.create_workflow(checkpointer=saver, pipeline=False)
+test_agent.run_scraping_agent(sys.argv[2], app=app, thread_id="crash")
+"""
+
+
+def _rows(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_crash_keeps_finished_steps_and_resume_skips_search(tmp_path, fixture_server, fixture_search):
+    import test_agent
+    from checkpoint import SqliteCheckpointer, make_serde
+    from records import LinkRecord, ProductRecord
+
+    path = str(tmp_path / "checkpoints.sqlite")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT] + sys.path), fixture_base_url=fixture_server.base_url)
+    proc = subprocess.run([sys.executable, "-c", CRASH_SCRIPT, path, QUERY], env=env, cwd=str(tmp_path),
+                          capture_output=True, text=True)
+    assert proc.returncode == 3, proc.stderr
+
+    assert _rows(path, "checkpoints") > 0
+    assert _rows(path, "writes") > 0
+
+    app = test_agent.create_workflow(
+        checkpointer=SqliteCheckpointer(path, serde=make_serde([LinkRecord, ProductRecord])), pipeline=False)
+    result = test_agent.run_scraping_agent(QUERY, app=app, thread_id="crash")
+
+    assert result["success"]
+    assert result["details_results"]["products"]
+    # the links came back from the checkpoint, serper was not asked again
+    assert fixture_search.calls == 0
+
+
+def test_compact_drops_old_threads(tmp_path, monkeypatch):
+    from langgraph.checkpoint.base import empty_checkpoint
+    from checkpoint import SqliteCheckpointer
+
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SqliteCheckpointer(path, max_age=3600)
+    now = [1_000_000.0]
+    monkeypatch.setattr("checkpoint.time.time", lambda: now[0])
+
+    for thread_id, written_at in (("batch-1", 1_000_000.0), ("batch-2", 1_003_000.0)):
+        now[0] = written_at
+        config = saver.put({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}},
+                           empty_checkpoint(), {}, {})
+        saver.put_writes(config, [("links", "x")], "task-1")
+
+    now[0] = 1_004_000.0   # batch-1 is 4000s old, batch-2 1000s
+    saver.compact()
+    assert [t.config["configurable"]["thread_id"] for t in saver.list(None)] == ["batch-2"]
+    assert _rows(path, "writes") == 1
+    saver.close()
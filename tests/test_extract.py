@@ -0,0 +1,10 @@
+# test_extract.py
+from extract import StreamingScanner
+
+
+def test_scanner_completes_when_the_title_closes_last():
+    scanner = StreamingScanner()
+    assert not scanner.feed_bytes(b'<html><head><meta property="product:price:amount" content="348.00">'
+                                  b'<meta property="product:price:currency" content="USD"><title>Echo Dot')
+    assert scanner.feed_bytes(b' (5th Gen)</title></head>')
+    assert scanner.fields()["title"] == "Echo Dot (5th Gen)"
@@ -0,0 +1,35 @@
+# test_parsepool.py
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+from extract import parse_html
+from parsepool import ParsePool
+
+# what a spawned worker runs before its initializer: the parent's main script as __mp_main__
+WORKER_SCRIPT = """
+import runpy, sys
+runpy.run_path(sys.argv[1], run_name="__mp_main__")
+import parsepool
+parsepool._warm_worker()
+print(" ".join(m for m in ("tool", "test_agent", "metrics", "langchain_core") if m in sys.modules))
+"""
+
+
+def test_workers_only_import_the_parser():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-c", WORKER_SCRIPT, os.path.join(ROOT, "cli.py")],
+                            env=env, cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
+
+
+def test_pool_matches_inline_parse(fixture_server):
+    pool = ParsePool(workers=1, shm_threshold=64 * 1024)
+    try:
+        for key, body in fixture_server.pages.items():
+            url = f"https://{key}"
+            assert pool.submit(body, url).result(timeout=60) == parse_html(body, url)
+    finally:
+        pool.close()
@@ -0,0 +1,82 @@
+# test_product_id.py
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from bench import FIXTURES_DIR
+from conftest import ROOT
+from ids import canonical_url, product_id
+
+
+def _recorded_links():
+    with open(os.path.join(FIXTURES_DIR, "serper.json"), encoding="utf-8") as f:
+        return sorted(set(re.findall(r'"link":\s*"([^"]+)"', f.read())))
+
+
+EXPECTED_IDS = {
+    "www.amazon.in": "amazon:B0CHX1W1XY",
+    "www.amazon.com": "amazon:B09XS7JWHH",
+    "www.flipkart.com": "flipkart:MOBGTAGPNMZA5PU5",
+    "www.ebay.com": "ebay:285531221463",
+    "www.walmart.com": "walmart:5098264419",
+    "www.bestbuy.com": "bestbuy:6505727",
+}
+
+
+@pytest.mark.parametrize("url", _recorded_links())
+def test_recorded_links(url):
+    host = url.split("/")[2]
+    if host not in EXPECTED_IDS:
+        assert product_id(url) == canonical_url(url)
+        return
+    assert product_id(url) == EXPECTED_IDS[host]
+    # the canonical url addresses the same product and is a fixed point
+    assert product_id(canonical_url(url)) == EXPECTED_IDS[host]
+    assert canonical_url(canonical_url(url)) == canonical_url(url)
+
+
+def test_flipkart_variants_keep_their_pid():
+    path = "https://www.flipkart.com/apple-iphone-15-pro-max-natural-titanium-256-gb/p/itm4a0093df4a3d7"
+    black = f"{path}?pid=MOBGTAGPNMZA5PU5&lid=LSTMOB&marketplace=FLIPKART"
+    white = f"{path}?pid=MOBGTAGPQ9YGZEZK"
+    assert product_id(black) == "flipkart:MOBGTAGPNMZA5PU5"
+    assert product_id(white) == "flipkart:MOBGTAGPQ9YGZEZK"
+    assert product_id(path) == "flipkart:itm4a0093df4a3d7"
+    assert canonical_url(black) == f"{path}?pid=MOBGTAGPNMZA5PU5"
+
+
+def test_flipkart_share_links():
+    share = ("https://dl.flipkart.com/dl/apple-iphone-15-pro-max-natural-titanium-256-gb/p/itm4a0093df4a3d7"
+             "?pid=MOBGTAGPNMZA5PU5&cmpid=product.share.pp")
+    assert canonical_url(share) == ("https://www.flipkart.com/apple-iphone-15-pro-max-natural-titanium-256-gb"
+                                    "/p/itm4a0093df4a3d7?pid=MOBGTAGPNMZA5PU5")
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.bestbuy.com/site/sony-wh1000xm5/6505727.p?skuId=6505727",
+    "https://www.bestbuy.com/site/6505727.p",
+    "https://m.bestbuy.com/site/sony-wh1000xm5/6505727.p?skuId=6505727&intl=nosplash",
+])
+def test_bestbuy_urls_collapse(url):
+    assert canonical_url(url) == "https://www.bestbuy.com/site/6505727.p?skuId=6505727"
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.amazon.in/gp/product/B0CHX1W1XY?ref=sr_1_1", "https://www.amazon.in/dp/B0CHX1W1XY"),
+    ("https://m.ebay.com/itm/Apple-iPhone/285531221463?hash=x", "https://www.ebay.com/itm/285531221463"),
+    ("https://www.walmart.com/ip/Apple-iPhone-15-Pro-Max/5098264419", "https://www.walmart.com/ip/5098264419"),
+])
+def test_id_paths(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_export_does_not_load_the_tools():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    script = "import sys, export; print(' '.join(m for m in ('tool', 'langchain_core') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], env=env, cwd=ROOT,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,53 @@
+# test_ratelimit.py
+import asyncio
+import sqlite3
+import threading
+import time
+
+from fetch import AsyncPageFetcher
+from ratelimit import DomainScheduler
+
+URL = "https://www.amazon.com/dp/B09XS7JWHH"
+
+
+def test_shared_state_does_not_block_the_loop(tmp_path):
+    path = str(tmp_path / "scheduler.db")
+    scheduler = DomainScheduler(["amazon."], state_path=path)
+
+    # another process holding the write lock for a while
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.5, other.execute, args=("COMMIT",)).start()
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.05)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        start = time.perf_counter()
+        await scheduler.aacquire(URL)
+        await scheduler.areport(URL, 429, 0.1, "7")
+        ticker.cancel()
+        return ticks, time.perf_counter() - start
+
+    ticks, elapsed = asyncio.run(run())
+    assert elapsed >= 0.4 and ticks >= 5
+    assert scheduler.stats()["amazon."]["throttled"] == 1
+    assert DomainScheduler(["amazon."], state_path=path)._update("amazon.", lambda s: s.blocked_until) > time.time()
+
+
+def test_session_of_a_finished_loop_is_closed():
+    fetcher = AsyncPageFetcher()
+
+    async def session():
+        return await fetcher._get_session()
+
+    first = asyncio.run(session())
+    second = asyncio.run(session())
+    assert second is not first and first.closed and not second.closed
+    asyncio.run(fetcher.close())
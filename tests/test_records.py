@@ -0,0 +1,23 @@
+# test_records.py
+import pytest
+
+import records
+from records import window_messages
+
+
+@pytest.mark.parametrize("window", [1, 2, 3, 8])
+def test_window_keeps_first_and_newest(monkeypatch, window):
+    monkeypatch.setattr(records, "MESSAGE_WINDOW", window)
+    history = []
+    for i in range(20):
+        history = window_messages(history, [f"m{i}"])
+        assert len(history) <= window
+        assert history[0] == "m0"
+
+    assert history == ["m0"] + [f"m{i}" for i in range(20 - (window - 1), 20)]
+
+
+def test_window_keeps_short_history(monkeypatch):
+    monkeypatch.setattr(records, "MESSAGE_WINDOW", 8)
+    assert window_messages(["a"], ["b", "c"]) == ["a", "b", "c"]
+    assert window_messages(None, ["a"]) == ["a"]
@@ -0,0 +1,113 @@
+# test_refresh.py
+import time
+
+import pytest
+
+import refresh
+import tool
+from cache import ProductIndex
+from extract import StreamingScanner
+
+AMAZON = "www.amazon.com/dp/B09XS7JWHH"
+CURRENT = {"price": {"value": 348.0, "currency": "USD"}, "availability": "In Stock", "rating": 4.5}
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = ProductIndex(path=str(tmp_path / "products.sqlite"))
+    monkeypatch.setattr(tool, "_index", index)
+    return index
+
+
+def _page(fixture_server, key, from_cache):
+    scanner = StreamingScanner(required=tuple(refresh.VOLATILE_FIELDS))
+    content = fixture_server.pages[key]
+    scanner.feed_bytes(content)
+    page = {"url": f"https://{key}", "error": None, "from_cache": from_cache, "content": content}
+    return page, scanner
+
+
+@pytest.mark.parametrize("from_cache", [False, True])
+def test_changes_against_the_tracked_record(fixture_server, index, from_cache):
+    old = dict(CURRENT, title="Echo", price={"value": 399.0, "currency": "USD"})
+    page, scanner = _page(fixture_server, AMAZON, from_cache)
+
+    event = refresh._check("amazon:B09XS7JWHH", page["url"], old, page, scanner, time.time())
+
+    # a 304 only says the page matches the cache, the tracked record can still be behind it
+    assert event["type"] == "changed"
+    assert event["changes"] == {"price": {"old": old["price"], "new": CURRENT["price"]}}
+    assert index.get("amazon:B09XS7JWHH") == dict(old, **CURRENT)
+
+
+@pytest.mark.parametrize("from_cache", [False, True])
+def test_unchanged(fixture_server, index, from_cache):
+    page, scanner = _page(fixture_server, AMAZON, from_cache)
+    event = refresh._check("amazon:B09XS7JWHH", page["url"], dict(CURRENT), page, scanner, time.time())
+    assert event["type"] == "unchanged"
+
+
+def test_newer_index_entry_is_kept(fixture_server, index):
+    submitted_at = time.time()
+    newer = dict(CURRENT, title="Echo Dot", price={"value": 329.0, "currency": "USD"})
+    index.put("amazon:B09XS7JWHH", f"https://{AMAZON}", newer)
+
+    page, scanner = _page(fixture_server, AMAZON, True)
+    old = dict(CURRENT, price={"value": 399.0, "currency": "USD"})
+    refresh._check("amazon:B09XS7JWHH", page["url"], old, page, scanner, submitted_at - 1)
+
+    assert index.get("amazon:B09XS7JWHH") == newer
+
+
+def test_update_keeps_fields_it_did_not_observe(index):
+    index.put("ebay:1", "https://www.ebay.com/itm/1", {"title": "Phone", "price": 1, "images": ["a"]})
+    assert index.update("ebay:1", "https://www.ebay.com/itm/1", {"price": 2}, base={}, observed_at=time.time())
+    assert index.get("ebay:1") == {"title": "Phone", "price": 2, "images": ["a"]}
+
+
+def test_parse_failure_is_an_error_event(fixture_server, index, monkeypatch):
+    def broken(content, url):
+        raise ValueError("bad markup")
+
+    monkeypatch.setattr(tool, "_parse_pool", None)
+    monkeypatch.setattr(tool, "parse_html", broken)
+    page = {"url": "https://www.ebay.com/itm/1", "error": None, "from_cache": False, "content": b"<html></html>"}
+
+    event = refresh._check("ebay:1", page["url"], {"price": 1}, page, StreamingScanner(), time.time())
+
+    assert event["type"] == "error" and "bad markup" in event["error"]
+    assert index.get("ebay:1") is None
+
+
+def test_refresh_products(fixture_search, fixture_server, index):
+    products = [
+        {"url": fixture_server.local_url(f"https://{AMAZON}"), **CURRENT},
+        {"url": fixture_server.local_url("https://www.ebay.com/itm/285531221463"), "price": None},
+        {"url": fixture_server.local_url("https://www.ebay.com/itm/000000000"), "price": None},
+        {"title": "no url"},
+    ]
+    events = {event["url"]: event for event in refresh.refresh_products(products, max_pending=2)}
+
+    assert len(events) == 3
+    assert events[products[0]["url"]]["type"] == "unchanged"
+    assert events[products[1]["url"]]["changes"]["price"]["new"] == {"value": 1099.99, "currency": "USD"}
+    assert events[products[2]["url"]]["type"] == "error"
+
+
+def test_index_records_expire_after_its_ttl(tmp_path, monkeypatch):
+    index = ProductIndex(path=str(tmp_path / "products.sqlite"), ttl=60)
+    index.put("amazon:B09XS7JWHH", f"https://{AMAZON}", CURRENT)
+    assert index.get("amazon:B09XS7JWHH") == CURRENT
+
+    now = time.time() + 60
+    monkeypatch.setattr("cache.time.time", lambda: now)
+    assert index.get("amazon:B09XS7JWHH") is None
+    assert (index.hits, index.stale) == (1, 1)
+
+
+def test_missing_rating_falls_back_to_the_full_parse(fixture_server):
+    key = "www.flipkart.com/apple-iphone-15-pro-max-natural-titanium-256-gb/p/itm4a0093df4a3d7"
+    page, scanner = _page(fixture_server, key, False)
+    assert scanner.fields()["price"] is not None and scanner.fields()["rating"] is None
+
+    assert refresh.volatile_fields(page["url"], page["content"], scanner)["rating"] == 4.6
@@ -0,0 +1,221 @@
+# test_resilience.py
+import asyncio
+import http.server
+import threading
+import time
+
+import aiohttp
+import pytest
+import requests
+
+from fetch import AsyncPageFetcher, PageFetcher
+from metrics import span
+from resilience import (
+    BLOCKED, CIRCUIT_OPEN, PERMANENT, THROTTLED, TRANSIENT,
+    CircuitBreaker, CircuitOpenError, ResilientCall, RetryPolicy, classify_exception, classify_status,
+)
+
+
+@pytest.fixture
+def stalling_server():
+    """Serves one page; the first request stalls for 5s before answering, later ones answer at once."""
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if len(hits) == 1:
+                time.sleep(5)
+            body = b"<html><title>ok</title></html>"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.hits = hits
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/www.amazon.com/dp/B09XS7JWHH"
+    yield server
+    server.shutdown()
+
+
+@pytest.mark.parametrize("status, expected", [
+    (200, None), (304, None), (404, PERMANENT), (410, PERMANENT), (401, BLOCKED), (403, BLOCKED),
+    (429, THROTTLED), (503, THROTTLED), (500, TRANSIENT), (502, TRANSIENT), (None, TRANSIENT),
+])
+def test_classify_status(status, expected):
+    assert classify_status(status) == expected
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.InvalidURL("http://"),
+    requests.exceptions.MissingSchema("www.amazon.com/dp/B0"),
+    requests.exceptions.InvalidSchema("ftp://www.amazon.com"),
+    requests.exceptions.InvalidHeader("bad header"),
+    requests.exceptions.TooManyRedirects("loop"),
+    aiohttp.InvalidURL("http://"),
+    ValueError("bug"),
+])
+def test_bad_requests_are_permanent(error):
+    assert classify_exception(error) == PERMANENT
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ConnectionError("reset"),
+    requests.exceptions.ReadTimeout("slow"),
+    TimeoutError(),
+    asyncio.TimeoutError(),
+    ConnectionResetError(),
+    aiohttp.ServerDisconnectedError(),
+])
+def test_network_errors_are_transient(error):
+    assert classify_exception(error) == TRANSIENT
+
+
+def test_http_errors_use_their_status():
+    response = requests.Response()
+    response.status_code = 403
+    assert classify_exception(requests.exceptions.HTTPError(response=response)) == BLOCKED
+    assert classify_exception(CircuitOpenError("open")) == CIRCUIT_OPEN
+
+
+def test_retry_policy_only_retries_transient():
+    policy = RetryPolicy(attempts=3, base_delay=0.1, max_delay=0.2)
+    assert policy.should_retry(TRANSIENT, 0)
+    assert policy.should_retry(TRANSIENT, 1)
+    assert not policy.should_retry(TRANSIENT, 2)
+    assert not any(policy.should_retry(c, 0) for c in (PERMANENT, BLOCKED, THROTTLED, CIRCUIT_OPEN, None))
+    assert all(0 <= policy.delay(attempt) <= 0.2 for attempt in range(10))
+
+
+def test_breaker_opens_and_probes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failures=2, cooldown=10)
+
+    breaker.report("amazon.com", TRANSIENT)
+    breaker.report("amazon.com", PERMANENT)   # says nothing about the upstream, resets the count
+    breaker.report("amazon.com", TRANSIENT)
+    assert breaker.state("amazon.com") == "closed"
+    breaker.report("amazon.com", TRANSIENT)
+    assert breaker.state("amazon.com") == "open"
+    assert not breaker.allow("amazon.com")
+
+    now[0] += 10
+    assert breaker.allow("amazon.com")
+    assert breaker.state("amazon.com") == "half_open"
+    assert not breaker.allow("amazon.com")      # one probe at a time
+    breaker.report("amazon.com", None)
+    assert breaker.state("amazon.com") == "closed"
+    assert breaker.stats()["amazon.com"]["rejected"] == 2
+
+
+def test_fetcher_does_not_retry_permanent_errors(fixture_server):
+    fetcher = PageFetcher(retry=RetryPolicy(attempts=3, base_delay=5))
+    missing = fetcher.fetch(f"{fixture_server.base_url}/www.amazon.com/dp/NOPE")
+    assert missing["status"] == 404 and missing["error_class"] == PERMANENT
+
+    # would sleep on a retry; PERMANENT returns straight away
+    bad = fetcher.fetch(fixture_server.base_url.replace("http://", "ftp://") + "/www.amazon.com/dp/NOPE")
+    assert bad["status"] is None and bad["error_class"] == PERMANENT
+    assert missing["elapsed"] < 5 and bad["elapsed"] < 5
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_fetch_retries_are_counted(use_async):
+    # nothing listens on port 9 here: connection refused is transient
+    url = "http://127.0.0.1:9/www.amazon.com/dp/B09XS7JWHH"
+    retry = RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.01)
+    with span("retry_test") as current:
+        if use_async:
+            async def fetch():
+                fetcher = AsyncPageFetcher(retry=retry)
+                try:
+                    return await fetcher.fetch(url)
+                finally:
+                    await fetcher.close()
+            result = asyncio.run(fetch())
+        else:
+            result = PageFetcher(retry=retry).submit(url).result()
+
+    assert result["error_class"] == TRANSIENT
+    assert current.counters.get("retries") == 2
+
+
+def test_cancelled_probe_frees_the_breaker():
+    breaker = CircuitBreaker(failures=1, cooldown=0.01)
+    breaker.report("serper", TRANSIENT)
+    time.sleep(0.02)
+    call = ResilientCall("serper", breaker, RetryPolicy(attempts=1))
+
+    async def probe():
+        task = asyncio.ensure_future(call.acall(lambda: asyncio.sleep(60)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(probe())
+    assert breaker.state("serper") == "open"     # no probe in flight any more
+    assert breaker.allow("serper")
+
+
+def test_cancelled_hedge_cancels_every_copy():
+    call = ResilientCall("serper", CircuitBreaker(), RetryPolicy(attempts=1), hedge_after=5)
+    started, cancelled = [], []
+
+    async def slow():
+        started.append(1)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        task = asyncio.ensure_future(call.acall(slow))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert started == [1] and cancelled == [1]
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_slow_fetch_is_hedged(stalling_server, use_async):
+    chunks = []
+
+    def consumer(chunk: bytes) -> bool:
+        chunks.append(chunk)
+        return False
+
+    start = time.perf_counter()
+    with span("hedge_test") as current:
+        if use_async:
+            async def fetch():
+                fetcher = AsyncPageFetcher(hedge_after=0.2)
+                try:
+                    return await fetcher.fetch(stalling_server.url, consumer)
+                finally:
+                    await fetcher.close()
+            result = asyncio.run(fetch())
+        else:
+            fetcher = PageFetcher(hedge_after=0.2)
+            try:
+                result = fetcher.fetch(stalling_server.url, consumer)
+            finally:
+                fetcher.close()
+
+    assert result["status"] == 200 and result["error"] is None
+    assert time.perf_counter() - start < 4
+    assert len(stalling_server.hits) == 2
+    assert current.counters.get("hedged_requests") == 1
+    assert b"".join(chunks) == b"<html><title>ok</title></html>"
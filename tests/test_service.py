@@ -0,0 +1,35 @@
+# test_service.py
+import sqlite3
+
+import service
+import test_agent
+from checkpoint import SqliteCheckpointer, make_serde
+from records import LinkRecord, ProductRecord
+
+
+QUERY = "iphone 15 pro max 256gb"
+
+
+def _threads(path):
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT thread_id FROM checkpoints UNION SELECT thread_id FROM writes")]
+
+
+def test_finished_jobs_leave_no_checkpoints(tmp_path, fixture_search, monkeypatch):
+    path = str(tmp_path / "checkpoints.sqlite")
+    app = test_agent.create_workflow(
+        checkpointer=SqliteCheckpointer(path, serde=make_serde([LinkRecord, ProductRecord])), pipeline=True)
+    monkeypatch.setattr(service, "get_workflow", lambda pipeline: app)
+
+    scraping = service.ScrapingService(workers=1, pipeline=True)
+    scraping.start()
+    try:
+        jobs = [scraping.submit(QUERY)[0], scraping.submit("sony wh-1000xm5")[0]]
+        results = [job.wait(timeout=60) for job in jobs]
+    finally:
+        scraping.stop()
+
+    assert all(result["success"] for result in results)
+    assert results[0]["details_results"]["products"]
+    assert _threads(path) == []
@@ -1,23 +1,171 @@
 # tool.py
 import re
-import requests
-from bs4 import BeautifulSoup
-from typing import List, Dict, Any, Optional
-from langchain_community.utilities import GoogleSerperAPIWrapper
+import json
+import asyncio
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Union, Iterator, Tuple, TYPE_CHECKING
 from langchain_core.tools import tool
 # from bs4 import BeautifulSoup
 import logging
 from dotenv import load_dotenv
 import os
+from fetch import PageFetcher, AsyncPageFetcher
+from metrics import span, record, get_logger
+from extract import StreamingScanner, merge_fields, parse_html
+from parsepool import ParsePool, PARSE_WORKERS
+from ratelimit import DomainScheduler
+from resilience import (CircuitBreaker, RetryPolicy, ResilientCall, FETCH_HEDGE_AFTER, SEARCH_HEDGE_AFTER,
+                        classify_exception)
+from ids import ALLOWED_DOMAINS, canonical_url, product_id, _source
+from cache import (ProductIndex, PRODUCT_INDEX_ENABLED, ResponseCache, TTLCache,
+                   SingleFlight, AsyncSingleFlight, SEARCH_CACHE_PATH, SEARCH_CACHE_TTL)
+
+if TYPE_CHECKING:
+    from langchain_community.utilities import GoogleSerperAPIWrapper
 
 
 load_dotenv()
 serper_api_key = os.getenv("serper_api_key")
 
 logging.basicConfig(level=logging.INFO)
+logger = get_logger(__name__)
 USER_AGENT = "Mozilla/5.0 (compatible; ProductScraper/1.0; +https://example.com/bot)"
 
-ALLOWED_DOMAINS = ["amazon.", "flipkart.", "ebay.", "walmart.", "bestbuy."]
+# product pages change slower on some marketplaces than others
+DOMAIN_CACHE_TTLS = {"amazon.": 1800, "flipkart.": 1800, "ebay.": 900, "walmart.": 3600, "bestbuy.": 3600}
+
+# requests/second per marketplace before adaptive backoff kicks in
+DOMAIN_RATES = {"amazon.": 1.0, "flipkart.": 1.0, "ebay.": 2.0, "walmart.": 1.0, "bestbuy.": 1.0}
+
+scheduler = DomainScheduler(domains=ALLOWED_DOMAINS, rates=DOMAIN_RATES)
+# one circuit per marketplace domain plus one for the search API
+breaker = CircuitBreaker()
+retry_policy = RetryPolicy()
+
+# full html parses run in worker processes when parse_workers > 0
+_parse_pool = ParsePool(PARSE_WORKERS) if PARSE_WORKERS else None
+
+_fetcher = PageFetcher(headers={"User-Agent": USER_AGENT},
+                       cache=ResponseCache(domain_ttls=DOMAIN_CACHE_TTLS),
+                       scheduler=scheduler, retry=retry_policy, breaker=breaker,
+                       hedge_after=FETCH_HEDGE_AFTER)
+# async tools share the response cache, rate limits and circuits with the thread pool fetcher
+_afetcher = AsyncPageFetcher(headers={"User-Agent": USER_AGENT}, cache=_fetcher.cache, scheduler=scheduler,
+                             retry=retry_policy, breaker=breaker, hedge_after=FETCH_HEDGE_AFTER)
+
+
+# "0" one query, "auto" adds site-restricted queries when it finds fewer than
+# FANOUT_MIN_LINKS links, "1" always sends every site query alongside the plain one
+SEARCH_FANOUT = os.getenv("search_fanout", "auto")
+FANOUT_MIN_LINKS = int(os.getenv("fanout_min_links", "3"))
+SITE_FILTERS = {"amazon.": "amazon.in", "flipkart.": "flipkart.com", "ebay.": "ebay.com",
+                "walmart.": "walmart.com", "bestbuy.": "bestbuy.com"}
+# serper results looked at per query before ranking
+MAX_CANDIDATES = 20
+
+# product id -> last extracted record, lets getProductDetails skip products it already holds;
+# expires after product_index_ttl, independent of how long the raw pages are cached
+_index = ProductIndex() if PRODUCT_INDEX_ENABLED else None
+
+_search_client: Optional["GoogleSerperAPIWrapper"] = None
+_search_cache = TTLCache(path=SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL)
+_search_flight = SingleFlight()
+_asearch_flight = AsyncSingleFlight()
+_search_pool = ThreadPoolExecutor(max_workers=len(SITE_FILTERS) + 1, thread_name_prefix="search")
+# serper calls are idempotent, so slow ones are hedged as well as retried
+_search_call = ResilientCall("serper", breaker, retry_policy, hedge_after=SEARCH_HEDGE_AFTER)
+
+# unit spellings collapsed to one token, e.g. "256 GB" / "256gigabytes" -> "256gb"
+_UNIT_ALIASES = [
+    (r"\b(\d+(?:\.\d+)?)\s*(?:gb|gigabytes?|gig)\b", r"\1gb"),
+    (r"\b(\d+(?:\.\d+)?)\s*(?:tb|terabytes?)\b", r"\1tb"),
+    (r"\b(\d+(?:\.\d+)?)\s*(?:mb|megabytes?)\b", r"\1mb"),
+    (r"\b(\d+(?:\.\d+)?)\s*(?:mah)\b", r"\1mah"),
+    (r"\b(\d+(?:\.\d+)?)\s*(?:inches|inch|\"|'')", r"\1inch"),
+    (r"\b(\d+(?:\.\d+)?)\s*(?:litres?|liters?|ltrs?|l)\b", r"\1l"),
+    (r"\b(\d+(?:\.\d+)?)\s*(?:millilitres?|milliliters?|ml)\b", r"\1ml"),
+    (r"\b(\d+(?:\.\d+)?)\s*(?:ounces?|oz)\b", r"\1oz"),
+]
+
+
+def canonical_query(query: str) -> str:
+    """Canonical cache key for a search query: case, whitespace and unit spelling are normalized."""
+    q = " ".join(query.lower().split())
+    for pattern, repl in _UNIT_ALIASES:
+        q = re.sub(pattern, repl, q)
+    return q
+
+
+def _get_search_client() -> "GoogleSerperAPIWrapper":
+    global _search_client
+    if _search_client is None:
+        # imported on the first search, it drags in most of langchain_community
+        from langchain_community.utilities import GoogleSerperAPIWrapper
+        _search_client = GoogleSerperAPIWrapper(serper_api_key=serper_api_key)
+    return _search_client
+
+
+def _search(query: str) -> Dict[str, Any]:
+    """Serper search behind the search cache; concurrent identical queries share one upstream call."""
+    key = canonical_query(query)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        record("cache_hits")
+        return cached
+    record("search_calls")
+
+    def upstream():
+        raw = _search_call.call(lambda: _get_search_client().results(query))
+        if isinstance(raw, dict) and raw.get("organic"):
+            _search_cache.set(key, raw)
+        return raw
+
+    return _search_flight.do(key, upstream)
+
+
+async def _asearch(query: str) -> Dict[str, Any]:
+    """_search() for the event loop, on serper's async client."""
+    key = canonical_query(query)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        record("cache_hits")
+        return cached
+    record("search_calls")
+
+    async def upstream():
+        raw = await _search_call.acall(lambda: _get_search_client().aresults(query))
+        if isinstance(raw, dict) and raw.get("organic"):
+            _search_cache.set(key, raw)
+        return raw
+
+    return await _asearch_flight.do(key, upstream)
+
+
+def site_query(query: str, domain: str) -> str:
+    return f"{query} site:{SITE_FILTERS[domain]}"
+
+
+def _search_many(queries: List[str]) -> List[Dict[str, Any]]:
+    """Run queries concurrently; a failed query counts as no results so the others still merge."""
+    # each task runs in a copy of this context, so search metrics land on the caller's span
+    futures = [_search_pool.submit(contextvars.copy_context().run, _search, q) for q in queries]
+    responses = []
+    for query, future in zip(queries, futures):
+        try:
+            responses.append(future.result())
+        except Exception as e:
+            logger.warning(f"search failed for {query!r}: {e}")
+            responses.append({})
+    return responses
+
+
+async def _asearch_many(queries: List[str]) -> List[Dict[str, Any]]:
+    responses = await asyncio.gather(*(_asearch(q) for q in queries), return_exceptions=True)
+    for query, response in zip(queries, responses):
+        if isinstance(response, Exception):
+            logger.warning(f"search failed for {query!r}: {response}")
+    return [{} if isinstance(response, Exception) else response for response in responses]
 
 
 def _is_allowed_url(url: str) -> bool:
@@ -30,8 +178,213 @@ def _clean_text(txt: Optional[str]) -> Optional[str]:
     return " ".join(txt.strip().split())
 
 
-def GetAsin(url: str) -> str:
-    return re.search(r'B0[A-Z0-9]{8}', url)
+def GetAsin(url: str) -> Optional[str]:
+    match = re.search(r'B0[A-Z0-9]{8}', url)
+    return match.group(0) if match else None
+
+
+def _link_url(link_obj: Dict[str, Any]) -> Optional[str]:
+    # getProductLinks emits 'url', raw serper results use 'link'
+    return link_obj.get("url") or link_obj.get("link")
+
+
+def _parse_links(text: str) -> List[Dict[str, Any]]:
+    text = text.strip().strip("`")
+    try:
+        parsed = json.loads(text[text.index("["):text.rindex("]") + 1])
+        return [p if isinstance(p, dict) else {"url": str(p)} for p in parsed]
+    except ValueError:
+        return [{"url": url} for url in re.findall(r"https?://[^\s'\",\]]+", text)]
+
+
+def _empty_record(url: Optional[str], error: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "url": url,
+        "source": _source(url) if url else None,
+        "asin": None,
+        "title": None,
+        "price": None,
+        "availability": None,
+        "images": [],
+        "specs": {},
+        "rating": None,
+        "raw_html_snippet": None,
+        "error": error,
+    }
+
+
+def _parse(url: str, content: bytes, scanner: Optional[StreamingScanner] = None) -> Future:
+    """
+    Future of (fields, description) from a full parse of content, on the parse pool
+    when one is configured. Streaming only limits how much of the page is downloaded:
+    the bytes read are always parsed, the scanner's fields fill what the parse left empty.
+    """
+    if _parse_pool is not None:
+        parsed = _parse_pool.submit(content, url)
+    else:
+        parsed = Future()
+        try:
+            parsed.set_result(parse_html(content, url))
+        except Exception as e:
+            parsed.set_exception(e)
+    if scanner is None:
+        return parsed
+
+    merged = Future()
+
+    def merge(done: Future):
+        try:
+            fields, description = done.result()
+        except Exception as e:
+            merged.set_exception(e)
+            return
+        description = description or scanner.meta.get("description") or scanner.meta.get("og:description")
+        merged.set_result((merge_fields(fields, scanner.fields()), description))
+
+    parsed.add_done_callback(merge)
+    return merged
+
+
+def warm_parse_pool():
+    """Start the parse workers up front, a no-op when parsing runs inline."""
+    if _parse_pool is not None:
+        _parse_pool.warm()
+
+
+def page_fetcher() -> PageFetcher:
+    """The shared page fetcher, with the response cache, scheduler, retries and breaker."""
+    return _fetcher
+
+
+def product_index() -> Optional[ProductIndex]:
+    """The shared product index, None when product_index=0."""
+    return _index
+
+
+def parse_page(url: str, content: bytes, scanner: Optional[StreamingScanner] = None) -> Future:
+    """Future of (fields, description) for a fetched page, parsed the way getProductDetails does."""
+    return _parse(url, content, scanner)
+
+
+def _build_record(url: str, fields: Dict[str, Any], description: Optional[str]) -> Dict[str, Any]:
+    record = _empty_record(url)
+
+    if "amazon." in url.lower():
+        record["asin"] = GetAsin(url)
+
+    record.update(fields)
+    snippet = _clean_text(description)
+    record["raw_html_snippet"] = snippet[:300] if snippet else None
+    return record
+
+
+def _extract_page(url: str, content: bytes, scanner: Optional[StreamingScanner] = None) -> Dict[str, Any]:
+    return _build_record(url, *_parse(url, content, scanner).result())
+
+
+def _link_items(raw: Any, top_k: int) -> Iterator[Dict[str, Any]]:
+    """Allowed-marketplace links from a raw serper response, in result order, at most top_k."""
+    org = raw.get("organic", []) if isinstance(raw, dict) else []
+    count = 0
+    for r in org:
+        link = r.get("link") or r.get("url") or ""
+        if not link or not _is_allowed_url(link):
+            continue
+        title = _clean_text(r.get("title") if r.get("title") else "")
+        snippet = _clean_text(r.get("snippet") or r.get("description") or "")
+
+        logger.debug(f"candidate link: {title} {link}")
+
+        yield {"source": _source(link), "url": canonical_url(link), "title": title, "snippet": snippet}
+        count += 1
+        if count >= top_k:
+            return
+
+
+def _rank_links(query: str, responses: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """
+    Merge link candidates from several search responses by product id and rank them:
+    share of query terms in the title first, then how many queries found the
+    product, then its best search position.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for raw in responses:
+        for position, item in enumerate(_link_items(raw, MAX_CANDIDATES)):
+            entry = merged.setdefault(product_id(item["url"]), {"item": item, "hits": 0, "position": position})
+            entry["hits"] += 1
+            entry["position"] = min(entry["position"], position)
+
+    terms = set(re.findall(r"[a-z0-9]+", canonical_query(query)))
+
+    def score(entry: Dict[str, Any]) -> float:
+        title = set(re.findall(r"[a-z0-9]+", canonical_query(entry["item"]["title"] or "")))
+        overlap = len(terms & title) / len(terms) if terms else 0.0
+        return overlap + 0.25 * (entry["hits"] - 1) - 0.02 * entry["position"]
+
+    ranked = sorted(merged.values(), key=score, reverse=True)
+    return [entry["item"] for entry in ranked[:top_k]]
+
+
+def _site_queries(productName: str) -> List[str]:
+    return [site_query(productName, d) for d in SITE_FILTERS]
+
+
+def _needs_fanout(productName: str, response: Dict[str, Any], top_k: int) -> bool:
+    found = len(list(_link_items(response, top_k)))
+    if found < FANOUT_MIN_LINKS:
+        logger.info(f"{found} links for {productName!r}, fanning out to {len(SITE_FILTERS)} sites")
+        return True
+    return False
+
+
+def _find_links(productName: str, top_k: int) -> List[Dict[str, Any]]:
+    if SEARCH_FANOUT == "0":
+        return list(_link_items(_search(productName), top_k))
+
+    if SEARCH_FANOUT == "1":
+        responses = _search_many([productName] + _site_queries(productName))
+    else:
+        responses = [_search(productName)]
+        if _needs_fanout(productName, responses[0], top_k):
+            responses += _search_many(_site_queries(productName))
+    return _rank_links(productName, responses, top_k)
+
+
+async def _afind_links(productName: str, top_k: int) -> List[Dict[str, Any]]:
+    if SEARCH_FANOUT == "0":
+        return list(_link_items(await _asearch(productName), top_k))
+
+    if SEARCH_FANOUT == "1":
+        responses = await _asearch_many([productName] + _site_queries(productName))
+    else:
+        responses = [await _asearch(productName)]
+        if _needs_fanout(productName, responses[0], top_k):
+            responses += await _asearch_many(_site_queries(productName))
+    return _rank_links(productName, responses, top_k)
+
+
+def _links_error(productName: str, e: Exception) -> Dict[str, Any]:
+    # the class tells the router whether searching again could help
+    error_class = classify_exception(e)
+    logger.warning(f"getProductLinks failed for {productName!r} ({error_class}): {e}")
+    return {"error": f"getProductLinks exception: {str(e)}", "error_class": error_class,
+            "query": productName, "results": []}
+
+
+def _product_links(productName: str, top_k: int) -> Dict[str, Any]:
+    try:
+        return {"query": productName, "results": _find_links(productName, top_k)}
+
+    except Exception as e:
+        return _links_error(productName, e)
+
+
+async def _aproduct_links(productName: str, top_k: int) -> Dict[str, Any]:
+    try:
+        return {"query": productName, "results": await _afind_links(productName, top_k)}
+
+    except Exception as e:
+        return _links_error(productName, e)
 
 
 @tool
@@ -62,44 +415,168 @@ def getProductLinks(productName: str, top_k: int = 8) -> Dict[str, Any]:
         ]
     }
     """
-    try:
-        search = GoogleSerperAPIWrapper(
-            serper_api_key=serper_api_key
-        )
-
-        raw = search.results(productName)
-        org = raw.get("organic", []) if isinstance(raw, dict) else []
-
-        items = []
-        for r in org:
-            link = r.get("link") or r.get("url") or ""
-            if not link:
-                continue
-            if _is_allowed_url(link):
-                title = _clean_text(r.get("title") if r.get("title") else "")
-                snippet = _clean_text(r.get("snippet") or r.get("description") or "")
-
-                print(f"Debug title: {title}")
-
-                domain = ""
-                for d in ALLOWED_DOMAINS:
-                    if d in link.lower():
-                        domain = d.strip(".")
-                        break
-                items.append({"source": domain or "unknown", "url": link,
-                             "title": title, "snippet": snippet})
-                if len(items) >= top_k:
-                    break
-
-        return {"query": productName, "results": items}
+    with span("getProductLinks", query=productName):
+        return _product_links(productName, top_k)
+
+
+async def _agetProductLinks(productName: str, top_k: int = 8) -> Dict[str, Any]:
+    with span("getProductLinks", query=productName):
+        return await _aproduct_links(productName, top_k)
+
+
+# ainvoke() runs the native coroutine instead of the sync body in a thread
+getProductLinks.coroutine = _agetProductLinks
+
+
+def _plan_details(links: Union[List[Dict[str, Any]], str]):
+    """
+    Split links into what is already known and what has to be fetched:
+    (urls, results with held records filled in, {product_id: (url, result positions)}).
+    Products the index holds fresh records for are not fetched, and urls that
+    point at the same product are fetched once.
+    """
+    if isinstance(links, str):
+        # ReAct agents pass the Action Input as one string
+        links = _parse_links(links)
+
+    urls = [_link_url(link_obj) for link_obj in links]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(urls)
+    pending: Dict[str, Tuple[str, List[int]]] = {}
+    for i, url in enumerate(urls):
+        if not url:
+            results[i] = _empty_record(None, "missing 'url' in link")
+            continue
+        held = _indexed(url)
+        if held is not None:
+            results[i] = held
+            continue
+        pending.setdefault(product_id(url), (url, []))[1].append(i)
+    return urls, results, pending
+
 
+def _fill_details(urls: List[Optional[str]], results: List[Optional[Dict[str, Any]]],
+                  pending: Dict[str, Tuple[str, List[int]]], products: List[Dict[str, Any]]) -> Dict[str, Any]:
+    for (pid, (url, positions)), product in zip(pending.items(), products):
+        _remember(pid, url, product)
+        for i in positions:
+            results[i] = dict(product, url=urls[i])
+    return {"results": results}
+
+
+def _product_details(links: Union[List[Dict[str, Any]], str]) -> Dict[str, Any]:
+    urls, results, pending = _plan_details(links)
+
+    fetch_urls = [url for url, _ in pending.values()]
+    scanners = {url: StreamingScanner() for url in fetch_urls}
+    pages = _fetcher.fetch_all(fetch_urls, consumer_factory=lambda url: scanners[url].feed_bytes)
+
+    # every page is handed to the parser before the first result is awaited,
+    # so a parse pool works on all of them at once
+    parsed = [_start_page(url, page, scanners[url]) for url, page in zip(fetch_urls, pages)]
+    products = [_page_result(url, page, future) for url, page, future in zip(fetch_urls, pages, parsed)]
+    return _fill_details(urls, results, pending, products)
+
+
+async def _aproduct_details(links: Union[List[Dict[str, Any]], str]) -> Dict[str, Any]:
+    urls, results, pending = _plan_details(links)
+
+    fetch_urls = [url for url, _ in pending.values()]
+    scanners = {url: StreamingScanner() for url in fetch_urls}
+    pages = await _afetcher.fetch_all(fetch_urls, consumer_factory=lambda url: scanners[url].feed_bytes)
+    products = await asyncio.gather(*(_apage_record(url, page, scanners[url])
+                                      for url, page in zip(fetch_urls, pages)))
+    return _fill_details(urls, results, pending, products)
+
+
+def _indexed(url: str) -> Optional[Dict[str, Any]]:
+    if _index is None:
+        return None
+    held = _index.get(product_id(url))
+    if held is None:
+        return None
+    record("index_hits")
+    return dict(held, url=url)
+
+
+def _remember(pid: str, url: str, product: Dict[str, Any]):
+    # only records that actually extracted something are worth reusing
+    if _index is not None and not product.get("error") and (product.get("title") or product.get("price")):
+        _index.put(pid, url, product)
+
+
+def _page_record(url: str, page: Dict[str, Any], scanner: StreamingScanner) -> Dict[str, Any]:
+    return _page_result(url, page, _start_page(url, page, scanner))
+
+
+def _start_page(url: str, page: Dict[str, Any], scanner: StreamingScanner) -> Optional[Future]:
+    record("http_bytes", len(page["content"]))
+    record("pages")
+    if page["from_cache"]:
+        record("cache_hits")
+    if page["error"]:
+        record("fetch_errors")
+        return None
+    return _parse(url, page["content"], scanner)
+
+
+def _page_result(url: str, page: Dict[str, Any], parsed: Optional[Future]) -> Dict[str, Any]:
+    if parsed is None:
+        return _empty_record(url, page["error"])
+    try:
+        return _build_record(url, *parsed.result())
     except Exception as e:
-        logging.exception("getProductLinks failed")
-        return {"error": f"getProductLinks exception: {str(e)}", "query": productName, "results": []}
+        logger.exception(f"Error in getProductDetails: {str(e)}")
+        return _empty_record(url, str(e))
+
+
+async def _apage_record(url: str, page: Dict[str, Any], scanner: StreamingScanner) -> Dict[str, Any]:
+    """_page_record() without parsing on the event loop: on the parse pool, or else in a thread."""
+    if _parse_pool is None and not page["error"]:
+        return await asyncio.to_thread(_page_record, url, page, scanner)
+    parsed = _start_page(url, page, scanner)
+    if parsed is not None:
+        await asyncio.wait([asyncio.wrap_future(parsed)])
+    return _page_result(url, page, parsed)
+
+
+def stream_products(productName: str, top_k: int = 8) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Search and detail extraction as one pipeline: each link's page fetch starts as
+    soon as the link is found and records are yielded in completion order, so the
+    first product is out after one page fetch.
+    Yields ("link", link) for every link, then ("product", record) per page.
+    """
+    with span("getProductLinks", query=productName):
+        links = _find_links(productName, top_k)
+
+    pending = {}
+    held = []
+    seen = set()
+    for item in links:
+        pid = product_id(item["url"])
+        if pid in seen:
+            continue
+        seen.add(pid)
+        product = _indexed(item["url"])
+        if product is not None:
+            held.append(product)
+        else:
+            scanner = StreamingScanner()
+            pending[_fetcher.submit(item["url"], scanner.feed_bytes)] = (pid, item["url"], scanner)
+        yield "link", item
+
+    for product in held:
+        yield "product", product
+
+    for future in as_completed(pending):
+        pid, url, scanner = pending[future]
+        product = _page_record(url, future.result(), scanner)
+        _remember(pid, url, product)
+        yield "product", product
 
 
 @tool
-def getProductDetails(links: List[Dict[str, Any]]) -> Dict[str, Any]:
+def getProductDetails(links: Union[List[Dict[str, Any]], str]) -> Dict[str, Any]:
     """
     Given a list of link dicts (each must contain 'url'), fetch page(s) and try to extract structured data.
     Input:
@@ -146,26 +623,13 @@ def getProductDetails(links: List[Dict[str, Any]]) -> Dict[str, Any]:
       }
     NOTE: This tool MUST NOT HALLUCINATE. If a field is not found, set null.
     """
-    results = []
-    headers = {"User-Agent": USER_AGENT}
-
-    for link_obj in links:
-        print(f"Debug link: {link_obj}")
+    with span("getProductDetails", links=len(links)):
+        return _product_details(links)
 
-        try:
-            resp = requests.get(url=link_obj["link"], headers=headers)
-            print(f"Debug request: {resp.content}")
-
-            soup = BeautifulSoup(resp.content, 'html_parser')
 
-            contents = soup.find_all('div')
+async def _agetProductDetails(links: Union[List[Dict[str, Any]], str]) -> Dict[str, Any]:
+    with span("getProductDetails", links=len(links)):
+        return await _aproduct_details(links)
 
-            for content in contents:
-                title = content.find('title')
-                link = content.find('href')
 
-                if "amazon.com" in link:
-                    asin = GetAsin(link)
-
-        except Exception as e:
-            logging.exception(f"Error in getProductDetails: {str(e)}")
+getProductDetails.coroutine = _agetProductDetails